@@ -1,5 +1,19 @@
-from bifrost.db.mss import MSs
-from bifrost.db.oracle import OracleDB
-from bifrost.db.pg import PgDB
+from importlib import import_module
+
+from bifrost.db.aio import AsyncQuery, gather
+from bifrost.db.basedb import ConnectionPool, transaction
+from bifrost.db.cache import IdentityMap, ResultCache, StatementCache
 from bifrost.db.sqlite3 import SqliteDB
 from bifrost.db.query import Query
+
+# The other drivers are imported on first use, so only the installed ones
+# are needed.
+_DRIVERS = {'MSs': 'bifrost.db.mss', 'OracleDB': 'bifrost.db.oracle',
+            'PgDB': 'bifrost.db.pg'}
+
+
+def __getattr__(name):
+    if name not in _DRIVERS:
+        raise AttributeError(
+            'module {!r} has no attribute {!r}'.format(__name__, name))
+    return getattr(import_module(_DRIVERS[name]), name)
@@ -0,0 +1,215 @@
+# Copyright (C) 2015 Clemente Junior
+#
+# This file is part of BifrostDB
+#
+# BifrostDB is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import sys
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from contextlib import asynccontextmanager
+from contextvars import ContextVar, copy_context
+from functools import partial
+from itertools import islice
+
+from bifrost.db import basedb
+from bifrost.db.query import Query, T_CLASS
+
+MAX_WORKERS = 10
+
+_executor = None
+_executor_lock = threading.Lock()
+_affinity = ContextVar('bifrost_executor', default=None)
+_worker = ContextVar('bifrost_worker', default=False)
+
+
+def set_executor(executor):
+    """
+    Set the executor that runs the blocking database calls, its number of
+    workers bounds the calls running at same time. Keep it at least the size
+    of the connection pools, the workers wait there for a free connection.
+    :param executor: a concurrent.futures.Executor.
+    """
+    global _executor
+    with _executor_lock:
+        _executor = executor
+
+
+def get_executor():
+    """
+    Return the executor of the blocking database calls, creating one with
+    MAX_WORKERS threads on the first call.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS,
+                                           thread_name_prefix='bifrost')
+        return _executor
+
+
+def gather(*calls, timeout=None):
+    """
+    Run independent database calls at same time on the executor threads, each
+    one with its own connection, so the wait is about the slowest call and
+    not the sum of them. The active identity map is shared with the calls.
+    The calls don't take part of a transaction opened by the caller.
+    Called from a call of run() or gather(), already on an executor thread,
+    the calls run one after another into that thread, since waiting for other
+    workers could take all of them; the timeout is then not applied. Don't
+    call it from other tasks submitted directly to the executor.
+
+        orders, total = gather(lambda: Query(Order).get(status='new'),
+                               Query(Customer).count)
+
+    :param calls: callables without arguments.
+    :param timeout: seconds to wait for all calls, None to wait forever.
+    :return: a list with the calls results, in order.
+    :raise: the exception of a failed call, after cancel the calls not
+            started yet. :raise BaseDBException: on timeout.
+    """
+    if _worker.get():
+        return [call() for call in calls]
+    executor = get_executor()
+    futures = [executor.submit(copy_context().run, _work, call)
+               for call in calls]
+    try:
+        done, pending = wait(futures, timeout, FIRST_EXCEPTION)
+        for future in futures:
+            if future in done and future.exception() is not None:
+                raise future.exception()
+        if pending:
+            raise basedb.BaseDBException('Timeout waiting the queries!!!')
+        return [future.result() for future in futures]
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+
+
+async def run(func, *args, **kwargs):
+    """
+    Run a blocking call without blocking the event loop, into a copy of the
+    caller context, so the active identity map is shared with the call. Into
+    a transaction() block the calls run always into the thread that holds its
+    connection.
+    :return: the call result.
+    """
+    executor = _affinity.get() or get_executor()
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, partial(copy_context().run, _work, func, *args, **kwargs))
+
+
+def _work(func, *args, **kwargs):
+    """
+    Run a call on an executor thread, into its own context, marked as a
+    worker call for gather().
+    """
+    _worker.set(True)
+    return func(*args, **kwargs)
+
+
+@asynccontextmanager
+async def transaction(factory):
+    """
+    Asynchronous version of bifrost.db.transaction(). The connection stays
+    bound to a thread of its own, that runs all calls awaited into the block,
+    so the models and queries that use the factory share it.
+
+        async with transaction(pool):
+            await order.asave()
+            await customer.asave()
+
+    :param factory: callable that open a new connection (e.g. a pool).
+    :return: the connection.
+    """
+    executor = ThreadPoolExecutor(max_workers=1,
+                                  thread_name_prefix='bifrost-transaction')
+    token = _affinity.set(executor)
+    block = basedb.transaction(factory)
+    try:
+        connection = await run(block.__enter__)
+        try:
+            yield connection
+        except BaseException:
+            await run(block.__exit__, *sys.exc_info())
+            raise
+        await run(block.__exit__, None, None, None)
+    finally:
+        _affinity.reset(token)
+        executor.shutdown(wait=False)
+
+
+class AsyncQuery(Query):
+    """
+    Query whose database methods are coroutines, running the blocking calls
+    on the executor. The options (order, limit, select_related...) and the
+    resultset work as in Query.
+
+        query = await AsyncQuery(Order).order('-id').limit(10).get()
+        async for order in query:
+            ...
+        async for order in AsyncQuery(Order).iterate(status='new'):
+            ...
+
+    """
+
+    async def get(self, result_type=T_CLASS, **where_clauses):
+        await run(Query.get, self, result_type, **where_clauses)
+        return self
+
+    async def count(self, **where_clauses):
+        return await run(Query.count, self, **where_clauses)
+
+    async def exists(self, **where_clauses):
+        return await run(Query.exists, self, **where_clauses)
+
+    async def delete(self, **where_clauses):
+        return await run(Query.delete, self, **where_clauses)
+
+    async def delete_all(self, chunk_size=500):
+        return await run(Query.delete_all, self, chunk_size)
+
+    async def update(self, values, **where_clauses):
+        return await run(Query.update, self, values, **where_clauses)
+
+    async def iterate(self, chunk_size=1000, result_type=T_CLASS,
+                      **where_clauses):
+        """
+        Iterate over objects from specifieds clauses, fetching and hydrating
+        chunk_size rows by executor call.
+        :return: an asynchronous generator of objects.
+        """
+        rows = Query.iterate(self, chunk_size, result_type, **where_clauses)
+        try:
+            while True:
+                chunk = await run(_take, rows, chunk_size)
+                if not chunk:
+                    break
+                for row in chunk:
+                    yield row
+        finally:
+            await run(rows.close)
+
+    async def __aiter__(self):
+        for row in self._resultset:
+            yield row
+
+
+def _take(rows, count):
+    """
+    Return a list with the next rows of an iterator.
+    """
+    return list(islice(rows, count))
@@ -15,12 +15,21 @@
 # You should have received a copy of the GNU General Public License
 # along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
 
+import threading
+import time
+from contextlib import contextmanager
+
+
+_bound = threading.local()
+
 
 class BaseDB:
     """
     Base class for all database connections and manipulation.
     """
 
+    ping_query = 'SELECT 1'
+
     def __init__(self):
         self.connection = None
         self.address = None
@@ -30,6 +39,28 @@ class BaseDB:
         self.db = None
         self.password = None
         self.is_valid = False
+        self.pool = None
+        self._transaction_depth = 0
+        self._bind_depth = 0
+        self._invalidations = set()
+
+    @classmethod
+    def create_pool(cls, *args, min_size=1, max_size=10, idle_timeout=300,
+                    ping_interval=30, timeout=None, **kwargs):
+        """
+        Create a connection pool for this database.
+        :param args: arguments to open a new connection.
+        :param min_size: connections kept opened even when idle.
+        :param max_size: maximum of connections opened at same time.
+        :param idle_timeout: seconds that an idle connection stay opened.
+        :param ping_interval: idle seconds before check if is alive.
+        :param timeout: seconds to wait for a free connection.
+        :param kwargs: keyword arguments to open a new connection.
+        :return: a ConnectionPool.
+        """
+        return ConnectionPool(lambda: cls(*args, **kwargs), min_size=min_size,
+                              max_size=max_size, idle_timeout=idle_timeout,
+                              ping_interval=ping_interval, timeout=timeout)
 
     def _verify_connection(self, host, user, password, db=None):
         """
@@ -37,11 +68,42 @@ class BaseDB:
         """
         pass
 
-    def _verify_field(self, field):
+    def _converter(self, type_code):
         """
-        Verify field value, and normalize if necessary.
+        Return the function that normalize the values of a column type, or
+        None when they don't need it. Need be overrided.
+        :param type_code: the type code of the column into cursor.description.
         """
-        return field
+        return None
+
+    def _plan(self, description):
+        """
+        Compile the conversions of a result set, once, from its description.
+        :return: tuple as ((column_index, function), ...) with only the
+                 columns that need conversion.
+        """
+        plan = []
+        for index, column in enumerate(description or ()):
+            converter = self._converter(column[1])
+            if converter is not None:
+                plan.append((index, converter))
+        return tuple(plan)
+
+    @staticmethod
+    def _convert(rows, plan):
+        """
+        Convert the rows of a result set into lists, applying its plan.
+        """
+        if not plan:
+            return [list(line) for line in rows]
+        result = []
+        for line in rows:
+            data = list(line)
+            for index, converter in plan:
+                if data[index] is not None:
+                    data[index] = converter(data[index])
+            result.append(data)
+        return result
 
     def _query(self, query, params=None):
         """
@@ -55,14 +117,9 @@ class BaseDB:
         if not self.is_valid:
             raise BaseDBException('This isn\'t a valid connection!!!')
         cursor = self.connection.cursor()
-        cursor.execute(query, params)
-        result = []
-        for line in cursor.fetchall():
-            data = []
-            for field in line:
-                data.append(self._verify_field(field))
-            result.append(data)
-        return result
+        self._execute(cursor, query, params)
+        return self._convert(cursor.fetchall(),
+                             self._plan(cursor.description))
 
     def _query_with_columns(self, query, params=None):
         """
@@ -78,22 +135,81 @@ class BaseDB:
             raise BaseDBException('This isn\'t a valid connection!!!')
 
         cursor = self.connection.cursor()
-        cursor.execute(query, params)
-        result = []
+        self._execute(cursor, query, params)
         columns = [name[0] for name in cursor.description]
-        for line in cursor.fetchall():
-            data = []
-            for field in line:
-                data.append(self._verify_field(field))
-            result.append(data)
-        return columns, result
+        return columns, self._convert(cursor.fetchall(),
+                                      self._plan(cursor.description))
+
+    def _iterate(self, query, params=None, chunk_size=1000):
+        """
+        Execute a query into database and yield its data in chunks, keeping
+        only chunk_size rows in memory. A query without rows yields a single
+        empty chunk, with the columns names.
+        :param query: the query body.
+        :param params: the bind variables.
+        :param chunk_size: number of rows fetched at time.
+        :return: generator of ([columns_names], [query_data]).
+        :raise BaseDBException:
+        """
+        if not params:
+            params = {}
+        if not self.is_valid:
+            raise BaseDBException('This isn\'t a valid connection!!!')
+        cursor = self._stream_cursor(chunk_size)
+        try:
+            cursor.execute(query, params)
+            rows = cursor.fetchmany(chunk_size)
+            columns = [name[0] for name in cursor.description]
+            plan = self._plan(cursor.description)
+            while True:
+                yield columns, self._convert(rows, plan)
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+        finally:
+            cursor.close()
+
+    def _execute(self, cursor, query, params):
+        """
+        Execute a statement into the cursor.
+        :param cursor: the cursor.
+        :param query: the statement body.
+        :param params: the bind variables.
+        """
+        cursor.execute(query, params)
+
+    def paginate(self, query, params, limit=None, offset=None):
+        """
+        Restrict a query to a page of its rows.
+        :param query: the query body.
+        :param params: the bind variables.
+        :param limit: maximum of rows, None for all.
+        :param offset: number of rows skipped.
+        :return: the query body and the bind variables of the page.
+        """
+        params = dict(params)
+        if limit is not None:
+            query += ' LIMIT %(bf_limit)s'
+            params['bf_limit'] = limit
+        if offset:
+            query += ' OFFSET %(bf_offset)s'
+            params['bf_offset'] = offset
+        return query, params
+
+    def _stream_cursor(self, chunk_size):
+        """
+        Return the cursor used to stream the query data.
+        """
+        cursor = self.connection.cursor()
+        cursor.arraysize = chunk_size
+        return cursor
 
     def _command(self, command, params=None):
         """
         Execute a non return query into database.
         :param command: the command body.
         :param params: the bind variables.
-        :return: :raise BaseDBException:
+        :return: the number of affected rows. :raise BaseDBException:
         """
 
         if not params:
@@ -101,11 +217,144 @@ class BaseDB:
         if not self.is_valid:
             raise BaseDBException('This isn\'t a valid connection!!!')
         cursor = self.connection.cursor()
-        cursor.execute(command, params)
-        self.connection.commit()
+        self._execute(cursor, command, params)
+        self._commit()
+        return cursor.rowcount
+
+    def _command_many(self, command, seq_params):
+        """
+        Execute a non return query into database once for each bind variables
+        set, with a single commit.
+        :param command: the command body.
+        :param seq_params: a list with the bind variables of each execution.
+        :return: :raise BaseDBException:
+        """
+        if not self.is_valid:
+            raise BaseDBException('This isn\'t a valid connection!!!')
+        cursor = self.connection.cursor()
+        cursor.executemany(command, seq_params)
+        self._commit()
         return True
 
+    def _insert(self, command, params, primary_key):
+        """
+        Execute an insert into database and return the generated key.
+        :param command: the insert command.
+        :param params: the bind variables.
+        :param primary_key: the primary key column name.
+        :return: the generated primary key. :raise BaseDBException:
+        """
+        if not self.is_valid:
+            raise BaseDBException('This isn\'t a valid connection!!!')
+        cursor = self.connection.cursor()
+        key = self._execute_insert(cursor, command, params, primary_key)
+        self._commit()
+        return key
+
+    def _insert_many(self, command, seq_params, primary_key):
+        """
+        Execute an insert once for each bind variables set, with a single
+        commit, and return the generated keys.
+        :param command: the insert command.
+        :param seq_params: a list with the bind variables of each execution.
+        :param primary_key: the primary key column name.
+        :return: a list with the generated keys. :raise BaseDBException:
+        """
+        if not self.is_valid:
+            raise BaseDBException('This isn\'t a valid connection!!!')
+        cursor = self.connection.cursor()
+        keys = [self._execute_insert(cursor, command, params, primary_key)
+                for params in seq_params]
+        self._commit()
+        return keys
+
+    def _execute_insert(self, cursor, command, params, primary_key):
+        """
+        Execute an insert into the cursor and return the generated key.
+        """
+        self._execute(cursor, command, params)
+        return cursor.lastrowid
+
+    def _commit(self):
+        """
+        Commit the connection, unless a transaction is opened: then the
+        commit is done at the end of the transaction.
+        """
+        if not self._transaction_depth:
+            self.connection.commit()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Open a transaction, all commands executed into the block are committed
+        together at its end, or rolled back if an exception is raised.
+        Nested blocks are part of the outermost transaction.
+        :return: this connection.
+        """
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_depth -= 1
+            if not self._transaction_depth:
+                try:
+                    self.connection.rollback()
+                finally:
+                    self._invalidate()
+            raise
+        self._transaction_depth -= 1
+        if not self._transaction_depth:
+            try:
+                self.connection.commit()
+            finally:
+                self._invalidate()
+
+    def invalidate_on_end(self, cache, table):
+        """
+        Invalidate again the cached results of a table at the end of the
+        opened transaction, when its writes are committed or rolled back.
+        :param cache: a ResultCache.
+        :param table: the table name.
+        """
+        self._invalidations.add((cache, table))
+
+    def _invalidate(self):
+        invalidations, self._invalidations = self._invalidations, set()
+        for cache, table in invalidations:
+            cache.invalidate(table)
+
+    @property
+    def in_transaction(self):
+        """
+        If a transaction is opened into this connection.
+        """
+        return self._transaction_depth > 0
+
+    def is_alive(self):
+        """
+        Verify if the connection still usable.
+        :return: True if the database answered the ping query.
+        """
+        if not self.is_valid:
+            return False
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(self.ping_query)
+            cursor.fetchall()
+            return True
+        except Exception:
+            return False
+
     def close(self):
+        """
+        Close the connection, or give it back when it came from a pool.
+        Does nothing while a transaction is opened or the connection is bound.
+        """
+        if self._transaction_depth or self._bind_depth:
+            return
+        if self.pool is not None:
+            self.pool.release(self)
+            return
         try:
             self.connection.close()
         except:
@@ -121,6 +370,261 @@ class BaseDBException(Exception):
         Exception.__init__(self, value)
 
 
+def connect(factory):
+    """
+    Open a connection with the factory, or return the one bound to it by a
+    transaction opened in this thread.
+    :param factory: callable that open a new connection.
+    :return: a connection.
+    """
+    connections = getattr(_bound, 'connections', None)
+    if connections:
+        connection = connections.get(factory)
+        if connection is not None:
+            return connection
+    return factory()
+
+
+def bound(factory):
+    """
+    Return the connection bound to the factory by a transaction opened in
+    this thread, or by bind().
+    :param factory: callable that open a new connection.
+    :return: a connection or None.
+    """
+    connections = getattr(_bound, 'connections', None)
+    if connections:
+        return connections.get(factory)
+    return None
+
+
+@contextmanager
+def bind(factory, connection):
+    """
+    Bind a connection to the factory into this thread while the block runs,
+    so the models and queries that use the factory share it, without opening
+    a transaction: each command still commits. Does nothing when the factory
+    is already bound.
+    :param factory: callable that open a new connection.
+    :param connection: a connection of the factory.
+    :return: the connection.
+    """
+    if not hasattr(_bound, 'connections'):
+        _bound.connections = {}
+    if factory in _bound.connections:
+        yield _bound.connections[factory]
+        return
+    _bound.connections[factory] = connection
+    connection._bind_depth += 1
+    try:
+        yield connection
+    finally:
+        connection._bind_depth -= 1
+        del _bound.connections[factory]
+
+
+@contextmanager
+def transaction(factory):
+    """
+    Open a transaction with a connection of the factory. While the block runs
+    the connection is bound to the factory into this thread, so the models and
+    queries that use the factory share it, and commit once at the end.
+    :param factory: callable that open a new connection (e.g. a pool).
+    :return: the connection.
+    """
+    if not hasattr(_bound, 'connections'):
+        _bound.connections = {}
+    connection = _bound.connections.get(factory)
+    if connection is not None:
+        with connection.transaction():
+            yield connection
+        return
+    connection = factory()
+    _bound.connections[factory] = connection
+    try:
+        with connection.transaction():
+            yield connection
+    finally:
+        del _bound.connections[factory]
+        connection.close()
+
+
+class ConnectionPool(object):
+    """
+    Thread-safe pool of database connections. Can be used anywhere a
+    connection factory is expected (as the create_connection of a model),
+    the connections given by the pool return to it when closed.
+    :param factory: callable that open a new connection.
+    :param min_size: connections kept opened even when idle.
+    :param max_size: maximum of connections opened at same time.
+    :param idle_timeout: seconds that an idle connection stay opened.
+    :param ping_interval: idle seconds before check if the connection is
+                          alive, 0 to check always and None to never check.
+    :param timeout: seconds to wait for a free connection, None wait forever.
+    """
+
+    def __init__(self, factory, min_size=1, max_size=10, idle_timeout=300,
+                 ping_interval=30, timeout=None):
+        if max_size < 1 or min_size > max_size:
+            raise BaseDBException('Invalid pool size!!!')
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+        self._closed = False
+        self._idle = []
+        self._lock = threading.Condition()
+        self._size = 0
+
+    def acquire(self):
+        """
+        Checkout a connection from the pool, opening a new one if necessary.
+        :return: a connection. :raise BaseDBException:
+        """
+        deadline = None if self.timeout is None \
+            else time.monotonic() + self.timeout
+        while True:
+            connection, released_at = self._checkout(deadline)
+            if connection is None:
+                connection = self._open()
+            elif self.ping_interval is not None and \
+                    time.monotonic() - released_at >= self.ping_interval \
+                    and not connection.is_alive():
+                self._discard(connection)
+                continue
+            connection.pool = self
+            return connection
+
+    def release(self, connection):
+        """
+        Checkin a connection into the pool, a connection already idle is
+        ignored.
+        :param connection: a connection given by acquire().
+        """
+        with self._lock:
+            if any(idle is connection for idle, _ in self._idle):
+                return
+        try:
+            connection.connection.rollback()
+        except Exception:
+            self._discard(connection)
+            return
+        with self._lock:
+            if not self._closed:
+                self._idle.append((connection, time.monotonic()))
+                self._lock.notify()
+                return
+        self._discard(connection)
+
+    def close(self):
+        """
+        Close all idle connections, the ones in use are closed on release.
+        """
+        with self._lock:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle = []
+        for connection in idle:
+            self._discard(connection)
+
+    @property
+    def size(self):
+        """
+        Number of connections opened by this pool.
+        """
+        return self._size
+
+    @property
+    def idle(self):
+        """
+        Number of connections waiting into the pool.
+        """
+        return len(self._idle)
+
+    def _checkout(self, deadline):
+        """
+        Take an idle connection or a slot to open a new one.
+        :return: (connection, released_at) or (None, None) for a new slot.
+        """
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise BaseDBException('This pool is closed!!!')
+                expired = self._expired()
+                if self._idle:
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = None if deadline is None \
+                    else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise BaseDBException('No connection available!!!')
+                self._lock.wait(remaining)
+            found = self._idle.pop() if self._idle else (None, None)
+        for connection in expired:
+            self._close(connection)
+        return found
+
+    def _expired(self):
+        """
+        Remove from the idle list the connections that exceeded idle_timeout.
+        Need be called with the lock.
+        """
+        expired = []
+        if self.idle_timeout is None:
+            return expired
+        limit = time.monotonic() - self.idle_timeout
+        while self._idle and self._size > self.min_size and \
+                self._idle[0][1] < limit:
+            expired.append(self._idle.pop(0)[0])
+            self._size -= 1
+        return expired
+
+    def _open(self):
+        """
+        Open a new connection into a slot already reserved.
+        """
+        try:
+            connection = self.factory()
+        except Exception:
+            self._free_slot()
+            raise
+        if not connection.is_valid:
+            self._free_slot()
+            raise BaseDBException('This isn\'t a valid connection!!!')
+        return connection
+
+    def _discard(self, connection):
+        """
+        Close a connection that will not return to the pool.
+        """
+        self._close(connection)
+        self._free_slot()
+
+    def _free_slot(self):
+        with self._lock:
+            self._size -= 1
+            self._lock.notify()
+
+    @staticmethod
+    def _close(connection):
+        connection.pool = None
+        connection.close()
+
+    def transaction(self):
+        """
+        Open a transaction with a connection of this pool, shared by all
+        models and queries that use the pool into this thread.
+        """
+        return transaction(self)
+
+    def __call__(self):
+        return self.acquire()
+
+
 class NoConnection(BaseDB):
     """
     class to set into models when dont have connection configured.
@@ -131,9 +635,6 @@ class NoConnection(BaseDB):
     def _verify_connection(self, host, user, password, db=None):
         pass
 
-    def _verify_field(self, field):
-        pass
-
     def query(self, query, params=None):
         raise BaseDBException('NO CONNECTION CONFIGURED!!')
 
@@ -142,3 +643,15 @@ class NoConnection(BaseDB):
 
     def command(self, command, params=None):
         raise BaseDBException('NO CONNECTION CONFIGURED!!')
+
+    def command_many(self, command, seq_params):
+        raise BaseDBException('NO CONNECTION CONFIGURED!!')
+
+    def insert(self, command, params, primary_key):
+        raise BaseDBException('NO CONNECTION CONFIGURED!!')
+
+    def insert_many(self, command, seq_params, primary_key):
+        raise BaseDBException('NO CONNECTION CONFIGURED!!')
+
+    def iterate(self, query, params=None, chunk_size=1000):
+        raise BaseDBException('NO CONNECTION CONFIGURED!!')
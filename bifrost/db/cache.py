@@ -0,0 +1,233 @@
+# Copyright (C) 2015 Clemente Junior
+#
+# This file is part of BifrostDB
+#
+# BifrostDB is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+
+class StatementCache(object):
+    """
+    Size-bounded LRU cache of compiled SQL statements, with hit and miss
+    counters.
+    :param max_size: maximum of statements kept.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        """
+        Return the statement compiled for a key, building it on a miss.
+        :param key: hashable description of the statement shape.
+        :param build: callable that compile the statement.
+        :return: the compiled statement.
+        """
+        with self._lock:
+            try:
+                statement = self._data[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return statement
+        statement = build()
+        with self._lock:
+            self._data[key] = statement
+            if len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+        return statement
+
+    def clear(self):
+        """
+        Remove all statements and reset the counters.
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def hit_ratio(self):
+        """
+        Fraction of the lookups that found a compiled statement.
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return '<StatementCache(size={}, hits={}, misses={})>'.format(
+            len(self), self.hits, self.misses)
+
+
+class ResultCache(object):
+    """
+    Size-bounded LRU cache of query results, with time to live. The results
+    are invalidated by table: a write into a table invalidates every result
+    that read from it. Share one cache among the models that are queried
+    together, so writes through any of them invalidate the others results.
+    :param max_size: maximum of results kept.
+    :param ttl: seconds that a result stays valid, None to never expire.
+    """
+
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, tables, load):
+        """
+        Return the result cached for a key, loading it on a miss.
+        :param key: hashable description of the query and its bind variables.
+        :param tables: names of the tables read by the query.
+        :param load: callable that execute the query.
+        :return: the query result.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, versions, result = entry
+                if (expires is None or expires > now) and all(
+                        self._versions.get(table, 0) == version
+                        for table, version in versions):
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return result
+                del self._data[key]
+            self.misses += 1
+            versions = tuple((table, self._versions.get(table, 0))
+                             for table in tables)
+        result = load()
+        with self._lock:
+            self._data[key] = (None if self.ttl is None else now + self.ttl,
+                               versions, result)
+            if len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+        return result
+
+    def invalidate(self, table):
+        """
+        Invalidate all results that read from a table.
+        :param table: the table name.
+        """
+        with self._lock:
+            self._versions[table] = self._versions.get(table, 0) + 1
+
+    def clear(self):
+        """
+        Remove all results and reset the counters.
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def hit_ratio(self):
+        """
+        Fraction of the lookups that found a valid result.
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return '<ResultCache(size={}, hits={}, misses={})>'.format(
+            len(self), self.hits, self.misses)
+
+
+_scopes = ContextVar('bifrost_identity_maps', default=())
+
+
+class IdentityMap(object):
+    """
+    Objects loaded into a unit of work, one per (model class, primary key).
+    While the map is active, as a context manager, the queries, loads and
+    foreign fields of the thread or task reuse the objects already loaded
+    instead of hydrating a new copy. The calls run by bifrost.db.aio see the
+    map active where they were awaited.
+
+        with IdentityMap():
+            orders = Query(Order).get()
+
+    """
+
+    def __init__(self):
+        self._objects = {}
+
+    def get(self, model_type, key):
+        """
+        Return the object of a model class with the primary key, or None.
+        """
+        return self._objects.get((model_type, key))
+
+    def add(self, obj):
+        """
+        Add an object with primary key to the map, unless another object of
+        its class and key is already there.
+        :return: the object kept by the map.
+        """
+        primary_key = obj._get_primary_key()
+        if not primary_key or primary_key[1] is None:
+            return obj
+        return self._objects.setdefault((obj.__class__, primary_key[1]), obj)
+
+    def clear(self):
+        """
+        Remove all objects from the map.
+        """
+        self._objects.clear()
+
+    def __enter__(self):
+        _scopes.set(_scopes.get() + (self,))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        stack = list(_scopes.get())
+        stack.remove(self)
+        _scopes.set(tuple(stack))
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __repr__(self):
+        return '<IdentityMap(size={})>'.format(len(self))
+
+
+def current_identity_map():
+    """
+    Return the innermost identity map active into this thread or task, or
+    None.
+    """
+    stack = _scopes.get()
+    return stack[-1] if stack else None
@@ -1,8 +1,14 @@
+import re
+
 import pymssql
 
 from bifrost.db.basedb import BaseDB, BaseDBException
 
 
+_INSERT = re.compile(r'INSERT INTO (.+?) \((.*)\)$', re.S)
+_PYFORMAT = re.compile(r'%\((\w+)\)s')
+
+
 class MSs(BaseDB):
     """
 Class for SQL Server database.
@@ -34,6 +40,76 @@ Class for SQL Server database.
             print(ee)
             self.is_valid = False
 
+    def _execute_insert(self, cursor, command, params, primary_key):
+        """
+        Execute an insert into the cursor and return the generated key.
+        """
+        head, values = command.rsplit(' VALUES ', 1)
+        cursor.execute('{} OUTPUT INSERTED."{}" VALUES {}'.format(
+            head, primary_key, values), params)
+        return cursor.fetchone()[0]
+
+    def _insert_many(self, command, seq_params, primary_key):
+        """
+        Insert the bind variables sets with one MERGE by batch, that outputs
+        the generated keys along with the position of its row, SQL Server
+        don't guarantee the OUTPUT order of an INSERT.
+        A batch has at most 1000 rows and 2100 bind variables.
+        """
+        if not self.is_valid:
+            raise BaseDBException('This isn\'t a valid connection!!!')
+        if not seq_params:
+            return []
+        head, template = command.rsplit(' VALUES ', 1)
+        table, columns = _INSERT.match(head).groups()
+        names = _PYFORMAT.findall(template)
+        batch_size = max(1, min(1000, 2000 // max(1, len(names))))
+        source = ', '.join('bf_source.{}'.format(column.strip())
+                           for column in columns.split(','))
+        cursor = self.connection.cursor()
+        keys = []
+        for start in range(0, len(seq_params), batch_size):
+            batch = seq_params[start:start + batch_size]
+            rows = []
+            params = {}
+            for row, row_params in enumerate(batch):
+                rows.append('{}, {})'.format(_PYFORMAT.sub(
+                    r'%(bf_{}_\1)s'.format(row), template)[:-1], row))
+                for name in names:
+                    params['bf_{}_{}'.format(row, name)] = row_params[name]
+            cursor.execute(
+                'MERGE INTO {0} USING (VALUES {1}) AS bf_source ({2}, '
+                'bf_row) ON 1 = 0 WHEN NOT MATCHED THEN INSERT ({2}) '
+                'VALUES ({3}) OUTPUT bf_source.bf_row, INSERTED."{4}";'.format(
+                    table, ', '.join(rows), columns, source, primary_key),
+                params)
+            batch_keys = [None] * len(batch)
+            for row, key in cursor.fetchall():
+                batch_keys[row] = key
+            keys.extend(batch_keys)
+        self._commit()
+        return keys
+
+    def paginate(self, query, params, limit=None, offset=None):
+        """
+Restrict a query to a page of its rows with OFFSET ... FETCH, that needs an
+ORDER BY.
+    :param query: query string to be restricted.
+    :param params: binding variables.
+    :param limit: maximum of rows, None for all.
+    :param offset: number of rows skipped.
+    :return: query string and binding variables of the page.
+        """
+        params = dict(params)
+        if ' ORDER BY ' not in query.upper():
+            query += ' ORDER BY (SELECT NULL)'
+        query += ' OFFSET %(bf_offset)s ROWS'
+        params['bf_offset'] = offset or 0
+        if limit is not None:
+            query += ' FETCH NEXT %(bf_limit)s ROWS ONLY'
+            params['bf_limit'] = limit
+        return query, params
+
     def query(self, query, params=None):
         """
 Execute a query into database.
@@ -66,6 +142,23 @@ Execute a query into database.
             print(ee)
             raise ee
 
+    def iterate(self, query, params=None, chunk_size=1000):
+        """
+Execute a query into database and yield its data in chunks.
+    :param query: query string to be executed.
+    :param params: binding variables.
+    :param chunk_size: number of rows fetched at time.
+    :return: generator of ([columns_names], [query_data]).
+        """
+        try:
+            yield from self._iterate(query, params, chunk_size)
+        except pymssql.DatabaseError as e:
+            print(e)
+            raise e
+        except Exception as ee:
+            print(ee)
+            raise ee
+
     def command(self, command, params=None):
         """
 Execute a command into database.
@@ -86,3 +179,71 @@ Execute a command into database.
         except Exception as ee:
             print(ee)
             raise ee
+
+    def command_many(self, command, seq_params):
+        """
+Execute a command into database once for each binding variables set.
+    :param command: command string to be executed.
+    :param seq_params: list of binding variables.
+        """
+        try:
+            return self._command_many(command, seq_params)
+        except pymssql.IntegrityError as e:
+            se = str(e)
+            if str(e).startswith('duplicate key value '
+                                 'violates unique constraint'):
+                raise BaseDBException('DUPLICATE KEY\n' + se)
+            raise e
+        except pymssql.DatabaseError as e:
+            print(e)
+            raise e
+        except Exception as ee:
+            print(ee)
+            raise ee
+
+    def insert(self, command, params, primary_key):
+        """
+Execute an insert into database and return the generated key, using
+    OUTPUT INSERTED.
+    :param command: insert string to be executed.
+    :param params: binding variables.
+    :param primary_key: primary key column name.
+    :return: the generated primary key.
+        """
+        try:
+            return self._insert(command, params, primary_key)
+        except pymssql.IntegrityError as e:
+            se = str(e)
+            if str(e).startswith('duplicate key value '
+                                 'violates unique constraint'):
+                raise BaseDBException('DUPLICATE KEY\n' + se)
+            raise e
+        except pymssql.DatabaseError as e:
+            print(e)
+            raise e
+        except Exception as ee:
+            print(ee)
+            raise ee
+
+    def insert_many(self, command, seq_params, primary_key):
+        """
+Execute an insert into database once for each binding variables set.
+    :param command: insert string to be executed.
+    :param seq_params: list of binding variables.
+    :param primary_key: primary key column name.
+    :return: list with the generated primary keys.
+        """
+        try:
+            return self._insert_many(command, seq_params, primary_key)
+        except pymssql.IntegrityError as e:
+            se = str(e)
+            if str(e).startswith('duplicate key value '
+                                 'violates unique constraint'):
+                raise BaseDBException('DUPLICATE KEY\n' + se)
+            raise e
+        except pymssql.DatabaseError as e:
+            print(e)
+            raise e
+        except Exception as ee:
+            print(ee)
+            raise ee
@@ -17,11 +17,16 @@
 
 import cx_Oracle
 
-from bifrost.db.basedb import BaseDB
+from bifrost.db.basedb import BaseDB, BaseDBException
 from bifrost.utils import replace_when_none
 
 
 class OracleDB(BaseDB):
+    ping_query = 'SELECT 1 FROM DUAL'
+    # OFFSET ... FETCH is available since Oracle 12c, set False to page with
+    # ROWNUM on older servers.
+    fetch_first = True
+
     def __init__(self, host, user, password):
         BaseDB.__init__(self)
         self._verify_connection(host, user, password)
@@ -42,13 +47,77 @@ class OracleDB(BaseDB):
             print(ee)
             self.is_valid = False
 
-    def _verify_field(self, field):
+    def paginate(self, query, params, limit=None, offset=None):
+        """
+        Restrict a query to a page of its rows. Paging with ROWNUM and an
+        offset adds the BF_ROWNUM column to the result.
+        :param query: the query body.
+        :param params: the bind variables.
+        :param limit: maximum of rows, None for all.
+        :param offset: number of rows skipped.
+        :return: the query body and the bind variables of the page.
+        """
+        params = dict(params)
+        if self.fetch_first:
+            if offset:
+                query += ' OFFSET :bf_offset ROWS'
+                params['bf_offset'] = offset
+            if limit is not None:
+                query += ' FETCH NEXT :bf_limit ROWS ONLY'
+                params['bf_limit'] = limit
+            return query, params
+        end = ''
+        if limit is not None:
+            end = ' WHERE ROWNUM <= :bf_end'
+            params['bf_end'] = (offset or 0) + limit
+        if not offset:
+            return 'SELECT * FROM ({}){}'.format(query, end), params
+        params['bf_offset'] = offset
+        return 'SELECT * FROM (SELECT bf_q.*, ROWNUM bf_rownum FROM ({}) ' \
+               'bf_q{}) WHERE bf_rownum > :bf_offset'.format(query, end), \
+            params
+
+    def _execute_insert(self, cursor, command, params, primary_key):
+        """
+        Execute an insert, already with the RETURNING INTO clause, into the
+        cursor and return the generated key.
+        """
+        new_key = cursor.var(int)
+        params[':bf_new_key'] = new_key
+        cursor.execute(command, params)
+        return new_key.getvalue()[0]
+
+    def _insert_many(self, command, seq_params, primary_key):
+        """
+        Insert all bind variables sets with array binding, the command already
+        need the RETURNING INTO clause, and return the generated keys.
+        """
+        if not self.is_valid:
+            raise BaseDBException('This isn\'t a valid connection!!!')
+        if not seq_params:
+            return []
+        cursor = self.connection.cursor()
+        new_key = cursor.var(int, arraysize=len(seq_params))
+        cursor.setinputsizes(bf_new_key=new_key)
+        cursor.executemany(command, seq_params)
+        self._commit()
+        return [new_key.getvalue(i)[0] for i in range(len(seq_params))]
+
+    @staticmethod
+    def _returning(command, primary_key):
         """
-        Verify field value, and normalize if necessary.
+        Add the clause that return the generated key into :bf_new_key.
         """
-        if isinstance(field, cx_Oracle.LOB):
-            return field.read()
-        return field
+        return '{} RETURNING "{}" INTO :bf_new_key'.format(command,
+                                                           primary_key)
+
+    def _converter(self, type_code):
+        """
+        Read the LOB values.
+        """
+        if type_code in (cx_Oracle.BLOB, cx_Oracle.CLOB, cx_Oracle.NCLOB):
+            return cx_Oracle.LOB.read
+        return None
 
     def query(self, query, params=None, encoding='cp1252'):
         """
@@ -95,6 +164,31 @@ Execute a query into database.
             print(ee)
             raise ee
 
+    def iterate(self, query, params=None, chunk_size=1000,
+                encoding='cp1252'):
+        """
+Execute a query into database and yield its data in chunks.
+    :param query: query string to be executed.
+    :param params: binding variables.
+    :param chunk_size: number of rows fetched at time.
+    :return: generator of ([columns_names], [query_data]).
+        """
+        try:
+            new_params = {}
+            for p in replace_when_none(params, {}):
+                if not p.startswith(':'):
+                    new_params[':{}'.format(p)] = params[p]
+                else:
+                    new_params[p] = params[p]
+            yield from self._iterate(query.encode(encoding), new_params,
+                                     chunk_size)
+        except cx_Oracle.DatabaseError as e:
+            print(e)
+            raise e
+        except Exception as ee:
+            print(ee)
+            raise ee
+
     def command(self, command, params=None, encoding='cp1252'):
         """
 Execute a command into database.
@@ -115,3 +209,84 @@ Execute a command into database.
         except Exception as ee:
             print(ee)
             raise ee
+
+    def command_many(self, command, seq_params, encoding='cp1252'):
+        """
+Execute a command into database once for each binding variables set, using
+array binding.
+    :param command: command string to be executed.
+    :param seq_params: list of binding variables.
+        """
+        try:
+            new_seq_params = []
+            for params in seq_params:
+                new_params = {}
+                for p in params:
+                    if not p.startswith(':'):
+                        new_params[':{}'.format(p)] = params[p]
+                    else:
+                        new_params[p] = params[p]
+                new_seq_params.append(new_params)
+            return self._command_many(command.encode(encoding),
+                                      new_seq_params)
+        except cx_Oracle.DatabaseError as e:
+            print(e)
+            raise e
+        except Exception as ee:
+            print(ee)
+            raise ee
+
+    def insert(self, command, params, primary_key, encoding='cp1252'):
+        """
+Execute an insert into database and return the generated key, using
+RETURNING INTO.
+    :param command: insert string to be executed.
+    :param params: binding variables.
+    :param primary_key: primary key column name.
+    :return: the generated primary key.
+        """
+        try:
+            new_params = {}
+            for p in replace_when_none(params, {}):
+                if not p.startswith(':'):
+                    new_params[':{}'.format(p)] = params[p]
+                else:
+                    new_params[p] = params[p]
+            return self._insert(self._returning(command, primary_key).encode(
+                encoding), new_params, primary_key)
+        except cx_Oracle.DatabaseError as e:
+            print(e)
+            raise e
+        except Exception as ee:
+            print(ee)
+            raise ee
+
+    def insert_many(self, command, seq_params, primary_key,
+                    encoding='cp1252'):
+        """
+Execute an insert into database once for each binding variables set, using
+array binding.
+    :param command: insert string to be executed.
+    :param seq_params: list of binding variables.
+    :param primary_key: primary key column name.
+    :return: list with the generated primary keys.
+        """
+        try:
+            new_seq_params = []
+            for params in seq_params:
+                new_params = {}
+                for p in params:
+                    if not p.startswith(':'):
+                        new_params[':{}'.format(p)] = params[p]
+                    else:
+                        new_params[p] = params[p]
+                new_seq_params.append(new_params)
+            return self._insert_many(self._returning(
+                command, primary_key).encode(encoding), new_seq_params,
+                primary_key)
+        except cx_Oracle.DatabaseError as e:
+            print(e)
+            raise e
+        except Exception as ee:
+            print(ee)
+            raise ee
@@ -15,11 +15,21 @@
 # You should have received a copy of the GNU General Public License
 # along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
 
+import re
+from collections import OrderedDict
+from itertools import count
+
 import psycopg2
+import psycopg2.extras
 
 from bifrost.db.basedb import BaseDB, BaseDBException
 
 
+_cursor_names = count()
+_statement_names = count()
+_PYFORMAT = re.compile(r'%\((\w+)\)s')
+
+
 class PgDB(BaseDB):
     """
 Class for PostgreSQL database.
@@ -27,10 +37,22 @@ Class for PostgreSQL database.
     :param user: database username.
     :param password: database password.
     :param db: database name.
+    :param prepared: use server-side prepared statements (PREPARE/EXECUTE)
+                     for the statements executed many times.
+    :param prepare_threshold: executions of a statement before prepare it.
+    :param max_prepared: prepared statements kept by the connection, the
+                         least recently used are deallocated.
     """
 
-    def __init__(self, host, user, password, db):
+    def __init__(self, host, user, password, db, prepared=False,
+                 prepare_threshold=5, max_prepared=100):
         BaseDB.__init__(self)
+        self.prepared = prepared
+        self.prepare_threshold = prepare_threshold
+        self.max_prepared = max_prepared
+        self._executions = {}
+        self._prepared = OrderedDict()
+        self._unprepared = set()
         self._verify_connection(host, user, password, db)
 
     def _verify_connection(self, host, user, password, db=None):
@@ -55,13 +77,134 @@ Class for PostgreSQL database.
             print(ee)
             self.is_valid = False
 
-    def _verify_field(self, field):
+    def _execute(self, cursor, query, params):
+        """
+        Execute a statement into the cursor, through a prepared statement
+        when it is hot enough.
+        """
+        statement = self._prepared.get(query) if self.prepared else None
+        if statement is None:
+            if not self.prepared or not self._is_hot(query, params):
+                cursor.execute(query, params)
+                return
+            statement = self._prepare(cursor, query)
+            if statement is None:
+                cursor.execute(query, params)
+                return
+        else:
+            self._prepared.move_to_end(query)
+        name, names = statement
+        if names:
+            cursor.execute('EXECUTE {} ({})'.format(
+                name, ', '.join(['%s'] * len(names))),
+                [params[key] for key in names])
+        else:
+            cursor.execute('EXECUTE {}'.format(name))
+
+    def _is_hot(self, query, params):
+        """
+        Count an execution of the statement and verify if it can be prepared.
+        Statements with None or sequence values are never prepared, their
+        SQL (IS NULL, IN lists) depends on the values.
+        """
+        if not isinstance(params, dict) or query in self._unprepared:
+            return False
+        for value in params.values():
+            if value is None or isinstance(value, (list, tuple)):
+                return False
+        if len(self._executions) > self.max_prepared * 10:
+            self._executions.clear()
+        executions = self._executions.get(query, 0) + 1
+        self._executions[query] = executions
+        return executions >= self.prepare_threshold
+
+    def _prepare(self, cursor, query):
+        """
+        Prepare a statement into the connection, deallocating the least
+        recently used one when the registry is full.
+        :return: (statement name, bind variables order) or None if the
+                 server can't prepare it.
+        """
+        names = []
+
+        def placeholder(match):
+            if match.group(1) not in names:
+                names.append(match.group(1))
+            return '${}'.format(names.index(match.group(1)) + 1)
+
+        text = _PYFORMAT.sub(placeholder, query).replace('%%', '%')
+        name = 'bf_statement_{}'.format(next(_statement_names))
+        self._executions.pop(query, None)
+        try:
+            cursor.execute('SAVEPOINT bf_prepare; PREPARE {} AS {}; '
+                           'RELEASE SAVEPOINT bf_prepare'.format(name, text))
+        except psycopg2.DatabaseError:
+            cursor.execute('ROLLBACK TO SAVEPOINT bf_prepare; '
+                           'RELEASE SAVEPOINT bf_prepare')
+            self._unprepared.add(query)
+            return None
+        self._prepared[query] = name, names
+        if len(self._prepared) > self.max_prepared:
+            cursor.execute('DEALLOCATE {}'.format(
+                self._prepared.popitem(last=False)[1][0]))
+        return name, names
+
+    def _command_many(self, command, seq_params):
+        """
+        Execute a command for each bind variables set, sending them in pages
+        to reduce the round-trips.
+        """
+        if not self.is_valid:
+            raise BaseDBException('This isn\'t a valid connection!!!')
+        cursor = self.connection.cursor()
+        psycopg2.extras.execute_batch(cursor, command, seq_params,
+                                      page_size=max(len(seq_params), 1))
+        self._commit()
+        return True
+
+    def _execute_insert(self, cursor, command, params, primary_key):
+        """
+        Execute an insert into the cursor and return the generated key.
+        """
+        self._execute(cursor, '{} RETURNING "{}"'.format(
+            command, primary_key), params)
+        return cursor.fetchone()[0]
+
+    def _insert_many(self, command, seq_params, primary_key):
         """
-        Verify field value, and normalize if necessary.
+        Insert all bind variables sets as a multi-row VALUES and return the
+        generated keys.
         """
-        if isinstance(field, memoryview):
-            return field.tobytes()
-        return field
+        if not self.is_valid:
+            raise BaseDBException('This isn\'t a valid connection!!!')
+        if not seq_params:
+            return []
+        head, template = command.rsplit(' VALUES ', 1)
+        cursor = self.connection.cursor()
+        result = psycopg2.extras.execute_values(
+            cursor, '{} VALUES %s RETURNING "{}"'.format(head, primary_key),
+            seq_params, template=template, page_size=len(seq_params),
+            fetch=True)
+        self._commit()
+        return [row[0] for row in result]
+
+    def _stream_cursor(self, chunk_size):
+        """
+        Return a named (server-side) cursor, so the rows stay on the server
+        until fetched.
+        """
+        cursor = self.connection.cursor(
+            name='bf_stream_{}'.format(next(_cursor_names)))
+        cursor.itersize = chunk_size
+        return cursor
+
+    def _converter(self, type_code):
+        """
+        The bytea values come as memoryview, convert them to bytes.
+        """
+        if type_code == psycopg2.BINARY:
+            return bytes
+        return None
 
     def query(self, query, params=None):
         """
@@ -96,6 +239,24 @@ Execute a query into database.
             print(ee)
             raise ee
 
+    def iterate(self, query, params=None, chunk_size=1000):
+        """
+Execute a query into database and yield its data in chunks, using a
+    server-side cursor.
+    :param query: query string to be executed.
+    :param params: binding variables.
+    :param chunk_size: number of rows fetched at time.
+    :return: generator of ([columns_names], [query_data]).
+        """
+        try:
+            yield from self._iterate(query, params, chunk_size)
+        except psycopg2.DatabaseError as e:
+            print(e)
+            raise e
+        except Exception as ee:
+            print(ee)
+            raise ee
+
     def command(self, command, params=None):
         """
 Execute a command into database.
@@ -117,3 +278,74 @@ Execute a command into database.
         except Exception as ee:
             print(ee)
             raise ee
+
+    def command_many(self, command, seq_params):
+        """
+Execute a command into database once for each binding variables set.
+    :param command: command string to be executed.
+    :param seq_params: list of binding variables.
+        """
+        try:
+            return self._command_many(command, seq_params)
+        except psycopg2.IntegrityError as e:
+            se = str(e)
+            if str(e).startswith('duplicate key value '
+                                 'violates unique constraint'):
+                raise BaseDBException('DUPLICATE KEY\n' + se)
+            else:
+                raise psycopg2.IntegrityError(se)
+        except psycopg2.DatabaseError as e:
+            print(e)
+            raise e
+        except Exception as ee:
+            print(ee)
+            raise ee
+
+    def insert(self, command, params, primary_key):
+        """
+Execute an insert into database and return the generated key, using
+    RETURNING.
+    :param command: insert string to be executed.
+    :param params: binding variables.
+    :param primary_key: primary key column name.
+    :return: the generated primary key.
+        """
+        try:
+            return self._insert(command, params, primary_key)
+        except psycopg2.IntegrityError as e:
+            se = str(e)
+            if str(e).startswith('duplicate key value '
+                                 'violates unique constraint'):
+                raise BaseDBException('DUPLICATE KEY\n' + se)
+            else:
+                raise psycopg2.IntegrityError(se)
+        except psycopg2.DatabaseError as e:
+            print(e)
+            raise e
+        except Exception as ee:
+            print(ee)
+            raise ee
+
+    def insert_many(self, command, seq_params, primary_key):
+        """
+Execute an insert into database once for each binding variables set.
+    :param command: insert string to be executed.
+    :param seq_params: list of binding variables.
+    :param primary_key: primary key column name.
+    :return: list with the generated primary keys.
+        """
+        try:
+            return self._insert_many(command, seq_params, primary_key)
+        except psycopg2.IntegrityError as e:
+            se = str(e)
+            if str(e).startswith('duplicate key value '
+                                 'violates unique constraint'):
+                raise BaseDBException('DUPLICATE KEY\n' + se)
+            else:
+                raise psycopg2.IntegrityError(se)
+        except psycopg2.DatabaseError as e:
+            print(e)
+            raise e
+        except Exception as ee:
+            print(ee)
+            raise ee
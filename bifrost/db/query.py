@@ -15,11 +15,138 @@
 # You should have received a copy of the GNU General Public License
 # along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
 
-from bifrost.utils import replace_when_none, nwe, normalize_db_values
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+
+from bifrost.db.basedb import BaseDBException, bind, bound, connect
+from bifrost.db.cache import current_identity_map
+from bifrost.utils import normalize_db_values
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 T_CLASS = 'class'
 T_LIST = 'list'
 T_DICT = 'dict'
+T_TUPLE = 'tuple'
+T_COLUMNS = 'columns'
+
+COLUMNS_CHUNK_SIZE = 10000
+
+
+def _columns(obj):
+    """
+    Return the database columns names from a model.
+    """
+    return obj._bf_info.columns
+
+
+def _cache_key(with_columns, query, params):
+    """
+    Return the result cache key of a query and its bind variables, or None
+    when some bind variable isn't hashable.
+    """
+    key = (with_columns, query, tuple(sorted(
+        (name, tuple(value) if isinstance(value, list) else value)
+        for name, value in params.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+@lru_cache(maxsize=256)
+def _row_class(columns):
+    """
+    Return the named tuple class of the T_TUPLE rows of a columns set,
+    created once for each set. Columns that aren't valid names are renamed
+    to their position, as _0.
+    :param columns: tuple with the columns names.
+    """
+    return namedtuple('Row', columns, rename=True)
+
+
+def _value(row, name):
+    """
+    Return the value of a field from a model or dictionary row.
+    """
+    if isinstance(row, dict):
+        return row[name]
+    return getattr(row, name)
+
+
+class _Column(object):
+    """
+    Values of a column of a T_COLUMNS result, appended by chunks. Keep a
+    numpy array when numpy is installed, else an array.array while the values
+    fit the typecode, then a list.
+    :param column_type: (typecode, dtype) from the column field, or None.
+    """
+
+    __slots__ = ('typecode', 'dtype', 'values')
+
+    def __init__(self, column_type):
+        self.typecode, self.dtype = column_type or (None, None)
+        if numpy is not None:
+            self.values = []
+        elif self.typecode is not None:
+            self.values = array(self.typecode)
+        else:
+            self.values = []
+
+    def extend(self, values):
+        dtype = self.dtype
+        if dtype == 'bool':
+            values = [value == 'Y' if isinstance(value, str) else value
+                      for value in values]
+            if None in values:
+                dtype = object
+        if numpy is not None:
+            try:
+                self.values.append(numpy.array(values, dtype=dtype))
+            except (TypeError, ValueError):
+                self.values.append(numpy.array(values, dtype=object))
+            return
+        if isinstance(self.values, array):
+            try:
+                self.values.extend(array(self.typecode, values))
+                return
+            except (TypeError, OverflowError):
+                self.values = list(self.values)
+        self.values.extend(values)
+
+    def result(self):
+        """
+        Return the column values as a single array.
+        """
+        if numpy is None:
+            return self.values
+        if not self.values:
+            return numpy.array([], dtype=self.dtype)
+        if len(self.values) == 1:
+            return self.values[0]
+        return numpy.concatenate(self.values)
+
+
+def _trim_row_number(columns, rows):
+    """
+    Remove the row number column added by a ROWNUM page.
+    """
+    if columns and columns[-1].lower() == 'bf_rownum':
+        return columns[:-1], [row[:-1] for row in rows]
+    return columns, rows
+
+
+def _shape(where_clauses):
+    """
+    Describe the where clauses as they change the compiled SQL: its keys and
+    which values are None.
+    """
+    return tuple((key, value is None) for key, value in where_clauses.items())
 
 
 class Query(object):
@@ -29,46 +156,141 @@ class Query(object):
     """
 
     def __init__(self, obj):
-        if type(obj) == type:
+        if isinstance(obj, type):
             obj = obj()
         self._obj = obj
         self._qry_init_part = obj.qry_init_part
         self._resultset = ()
-        self._order_by = ''
+        self._order_by = []
+        self._related = []
         self._custom_qry_init_part = ''
+        self._limit = None
+        self._offset = 0
+        self._after = {}
+        self._indexes = {}
+        self._indexed = None
         self._where_opt = {'not': ' <> ', 'like': ' like ',
                            'not_like': 'not like ', 'lt': '<', 'lte': '<=',
                            'gt': '>', 'gte': '>=', 'in': 'in',
                            'not_in': 'not in'}
 
-    def delete_all(self):
+    def delete(self, **where_clauses):
+        """
+    Delete all rows that match the specifieds clauses with a single command,
+    without load them.
+    :param where_clauses: clauses according with model fields.
+    :return: the number of deleted rows.
+        """
+        params = normalize_db_values(where_clauses, self._obj)
+        command = self._obj._bf_statement(
+            ('delete', _shape(params)),
+            lambda: 'DELETE FROM {} WHERE{}'.format(
+                self._obj.table_name, self._where_string(params)))
+        connection = connect(self._obj.create_connection)
+        try:
+            return connection.command(command, params)
+        finally:
+            connection.close()
+            self._obj._bf_invalidate()
+
+    def delete_all(self, chunk_size=500):
         """
     Delete all rows of objects stored in this query. Only if the query are made
     in T_CLASS format, otherwise will rise an AttributeError exception.
-    :return:
+    :param chunk_size: number of primary keys deleted by each command.
+    :return: the number of deleted objects.
+        """
+        primary_key = self._obj._get_primary_key()
+        if not primary_key:
+            return self._delete_by_all_fields()
+        keys = [obj._get_primary_key()[1] for obj in self._resultset]
+        connection = connect(self._obj.create_connection)
+        try:
+            for start in range(0, len(keys), chunk_size):
+                params = {}
+                for key in keys[start:start + chunk_size]:
+                    params['bf_pk_{}'.format(len(params))] = key
+                cmd = self._obj._bf_statement(
+                    ('delete_in', len(params)),
+                    lambda: 'DELETE FROM {} WHERE {} IN ({})'.format(
+                        self._obj.table_name,
+                        self._obj.normalize_column(primary_key[0]),
+                        ', '.join('%({})s'.format(key) for key in params)))
+                connection.command(cmd, params)
+        finally:
+            connection.close()
+            self._obj._bf_invalidate()
+        self._resultset = ()
+        return len(keys)
+
+    def _delete_by_all_fields(self):
+        """
+    Delete the objects stored in this query one by one, matching all fields,
+    for models without primary key.
+    :return: the number of deleted objects.
         """
         count = 0
-        connection = self._obj.create_connection()
-        for obj in self._resultset:
-            count_attr = 0
-            data = normalize_db_values(obj._data_dict(), self._obj)
-            cmd = "DELETE FROM {} WHERE".format(self._obj.table_name)
-            for key in data:
-                if data[key] is None:
-                    cmd += ' {} is %({})s AND'.format(
-                        obj.normalize_column(key), key)
-                else:
-                    cmd += ' {}=%({})s AND'.format(obj.normalize_column(key),
-                                                   key)
-                count_attr += 1
-            if cmd.endswith(' AND'):
-                cmd = cmd[0:len(cmd) - 4]
-            connection.command(cmd, data)
-            count += 1
-        connection.close()
+        connection = connect(self._obj.create_connection)
+        try:
+            for obj in self._resultset:
+                data = normalize_db_values(obj._data_dict(), self._obj)
+                cmd = "DELETE FROM {} WHERE".format(self._obj.table_name)
+                for key in data:
+                    if data[key] is None:
+                        cmd += ' {} is %({})s AND'.format(
+                            obj.normalize_column(key), key)
+                    else:
+                        cmd += ' {}=%({})s AND'.format(
+                            obj.normalize_column(key), key)
+                if cmd.endswith(' AND'):
+                    cmd = cmd[0:len(cmd) - 4]
+                connection.command(cmd, data)
+                count += 1
+        finally:
+            connection.close()
+            self._obj._bf_invalidate()
         self._resultset = ()
         return count
 
+    def count(self, **where_clauses):
+        """
+    Count the rows that match the specifieds clauses on the server, without
+    load them.
+    :param where_clauses: clauses according with model fields.
+    :return: the number of rows.
+        """
+        return self._scalar('count', 'SELECT COUNT(*) FROM {} WHERE{}',
+                            where_clauses)
+
+    def exists(self, **where_clauses):
+        """
+    Verify on the server if some row match the specifieds clauses, reading at
+    most one row.
+    :param where_clauses: clauses according with model fields.
+    :return: True if a row matched.
+        """
+        return self._scalar('exists', 'SELECT 1 FROM {} WHERE{}',
+                            where_clauses, (1, 0)) is not None
+
+    def _scalar(self, name, template, where_clauses, page=None):
+        """
+        Execute a query of a single value with the where clauses of get().
+        :return: the value of the first row, or None without rows.
+        """
+        params = normalize_db_values(where_clauses, self._obj)
+        query = self._obj._bf_statement(
+            (name, _shape(params)), lambda: template.format(
+                self._obj.table_name, self._where_string(params)))
+        cache = self._result_cache()
+        key = _cache_key(False, (query, page), params) \
+            if cache is not None else None
+        if key is None:
+            rows = self._query(query, params, False, page)
+        else:
+            rows = cache.get(key, (self._obj.table_name,),
+                             lambda: self._query(query, params, False, page))
+        return rows[0][0] if rows else None
+
     def get(self, result_type=T_CLASS, **where_clauses):
         """
     Get objects from specifieds clauses.
@@ -76,85 +298,255 @@ class Query(object):
                         'class' for a model.
                         'dict' for a dictionary
                         'list' for a list.
+                        'tuple' for an immutable named tuple, its class
+                        is shared by all queries with the same columns.
+                        'columns' for a dictionary as {column: values}, the
+                        values into a numpy array when numpy is installed,
+                        else into an array.array for the typed fields.
     :param where_clauses: clauses according with model fields.
     :return:
         """
-        connection = self._obj.create_connection()
-        query = replace_when_none(nwe(self._custom_qry_init_part), self._qry_init_part)
-        where_clauses = normalize_db_values(where_clauses, self._obj)
+        query, where_clauses, result_type, page = self._select_string(
+            where_clauses, result_type)
         self._resultset = ()
-        result_type = T_DICT if self._custom_qry_init_part else result_type
-        if len(where_clauses) == 0:
-            query += ' 1=1'
+        if result_type == T_COLUMNS:
+            self._resultset = self._get_columns(query, where_clauses, page)
+            return self
+        with_columns = result_type in (T_CLASS, T_DICT, T_TUPLE)
+        related = tuple(self._related)
+        cache = self._result_cache()
+        key = _cache_key(with_columns, (query, page), where_clauses) \
+            if cache is not None else None
+        if key is None:
+            data = self._query(query, where_clauses, with_columns, page)
         else:
-            for key in where_clauses.keys():
-                sep = '__'
-                if sep in key:
-                    opt = key.split(sep)[-1]
-                    if opt in self._where_opt:
-                        if where_clauses[key] is None and opt == 'not':
-                            query += ' {} is not %({})s ' \
-                                     'AND'.format(self._obj.normalize_column(
-                                key.split(sep + opt)[0]), key)
-                        else:
-                            query += ' {} {} %({})s AND'.format(
-                                self._obj.normalize_column(
-                                    key.split(sep + opt)[0]),
-                                self._where_opt[opt], key)
-                        continue
-                if where_clauses[key] is None:
-                    query += ' {} is %({})s AND'.format(
-                        self._obj.normalize_column(key), key)
-                else:
-                    query += ' {} = %({})s AND'.format(
-                        self._obj.normalize_column(key), key)
-        query = query.strip('AND') + self._order_by
-        if result_type == T_CLASS:
-            self._populate_dict(connection.query_with_columns(query,
-                                                              where_clauses))
-        elif result_type == T_DICT:
-            self._populate_dict(
-                connection.query_with_columns(query, where_clauses),
-                result_type)
+            data = cache.get(key, self._tables(related), lambda: self._query(
+                query, where_clauses, with_columns, page))
+            if not with_columns:
+                data = [list(row) for row in data]
+        if with_columns:
+            self._populate_dict(data, result_type)
         else:
-            self._populate(connection.query(query, where_clauses))
-        connection.close()
-        self._order_by = ''
-        self._custom_qry_init_part = ''
+            self._populate(data)
         return self
 
+    def _query(self, query, params, with_columns, page=None):
+        """
+        Execute the select of get().
+        """
+        connection = connect(self._obj.create_connection)
+        try:
+            if page is not None:
+                query, params = connection.paginate(query, params, *page)
+                columns, rows = _trim_row_number(
+                    *connection.query_with_columns(query, params))
+                return (columns, rows) if with_columns else rows
+            if with_columns:
+                return connection.query_with_columns(query, params)
+            return connection.query(query, params)
+        finally:
+            connection.close()
+
+    def _get_columns(self, query, params, page):
+        """
+        Execute the select of get() filling a column of values for each
+        selected column, chunk by chunk, without building rows. Without rows
+        the columns are empty.
+        """
+        result = None
+        connection = connect(self._obj.create_connection)
+        try:
+            if page is not None:
+                query, params = connection.paginate(query, params, *page)
+            for columns, rows in connection.iterate(query, params,
+                                                    COLUMNS_CHUNK_SIZE):
+                if page is not None:
+                    columns, rows = _trim_row_number(columns, rows)
+                if result is None:
+                    result = {column: _Column(self._column_type(column))
+                              for column in columns}
+                for column, values in zip(columns, zip(*rows)):
+                    result[column].extend(values)
+        finally:
+            connection.close()
+        return {column: values.result() for column, values in result.items()}
+
+    def _column_type(self, column):
+        """
+        Return the (typecode, dtype) of the field of a column, or None.
+        """
+        name = self._obj._bf_fields_objects.get(column)
+        if name is None:
+            return None
+        return self._obj._bf_field(name)._bf_column_type
+
+    def _tables(self, related):
+        """
+        Return the names of the tables read by a select with related fields.
+        """
+        return self._obj._bf_statement(
+            ('tables', related), lambda: (self._obj.table_name,) + tuple(
+                self._obj._bf_field(name).create().table_name
+                for name in related))
+
+    def _result_cache(self):
+        """
+        Return the result cache of the model, or None while a transaction is
+        opened with its connection factory, that can see uncommitted rows.
+        """
+        cache = self._obj.bf_result_cache
+        if cache is None:
+            return None
+        connection = bound(self._obj.create_connection)
+        if connection is not None and connection.in_transaction:
+            return None
+        return cache
+
+    def iterate(self, chunk_size=1000, result_type=T_CLASS, **where_clauses):
+        """
+    Iterate over objects from specifieds clauses without store them into the
+    resultset, fetching and hydrating chunk_size rows at time.
+    :param chunk_size: number of rows fetched at time.
+    :param result_type: type of the yielded objects, as in get().
+    :param where_clauses: clauses according with model fields.
+    :return: a generator of objects.
+        """
+        query, where_clauses, result_type, page = self._select_string(
+            where_clauses, result_type)
+        return self._iterate(query, where_clauses, chunk_size, result_type,
+                             page)
+
+    def _iterate(self, query, params, chunk_size, result_type, page=None):
+        """
+        Stream the query data from a connection, see iterate(). The
+        connection stays bound to the factory while each chunk is hydrated,
+        so the loads of foreign fields reuse it instead of checkout another.
+        """
+        factory = self._obj.create_connection
+        connection = connect(factory)
+        try:
+            if page is not None:
+                query, params = connection.paginate(query, params, *page)
+            for columns, rows in connection.iterate(query, params,
+                                                    chunk_size):
+                if page is not None:
+                    columns, rows = _trim_row_number(columns, rows)
+                if result_type in (T_CLASS, T_DICT, T_TUPLE):
+                    with bind(factory, connection):
+                        rows = self._rows_dict(columns, rows, result_type)
+                yield from rows
+        finally:
+            connection.close()
+
     def only(self, **restrictions):
         """
-        Work like get() into the resultset after the query was filled.
+        Work like get() into the resultset after the query was filled. The
+        rows are taken from the index of a restricted field, when built by
+        index_by().
         :param restrictions: restriction according with model fields.
         :return:
         """
+        rows = self._resultset
+        indexes = self._indexes if self._indexed is self._resultset else {}
+        for key in restrictions:
+            if key in indexes:
+                try:
+                    rows = indexes[key].get(restrictions[key], ())
+                except TypeError:
+                    continue
+                break
         to_return = []
-        for row in self._resultset:
-            can_entry = True
+        for row in rows:
             for key in restrictions:
-                if row.__getattribute__(key) != restrictions[key]:
-                    can_entry = False
-            if can_entry:
+                if _value(row, key) != restrictions[key]:
+                    break
+            else:
                 to_return.append(row)
         return to_return
 
+    def index_by(self, *fields):
+        """
+        Build hash indexes of the resultset on the fields, used by only().
+        The indexes are discarded when the resultset changes.
+        :param fields: fields names.
+        :return: this query.
+        """
+        for name in fields:
+            self._index(name)
+        return self
+
+    def group_by_field(self, field):
+        """
+        Group the resultset by the value of a field, in a single pass.
+        :param field: the field name.
+        :return: a dictionary as {value: [rows], ...}
+        """
+        return {value: list(rows)
+                for value, rows in self._index(field).items()}
+
+    def _index(self, name):
+        """
+        Return the index of a field, building it on the first call.
+        """
+        if self._indexed is not self._resultset:
+            self._indexes = {}
+            self._indexed = self._resultset
+        index = self._indexes.get(name)
+        if index is None:
+            index = {}
+            for row in self._resultset:
+                index.setdefault(_value(row, name), []).append(row)
+            self._indexes[name] = index
+        return index
+
+    def limit(self, count):
+        """
+        Limit the number of rows of the next get() or iterate().
+        :param count: maximum of rows.
+        :return: this query.
+        """
+        self._limit = count
+        return self
+
+    def offset(self, count):
+        """
+        Skip the first rows of the next get() or iterate(). Deep offsets still
+        read the skipped rows on the server, prefer after() to page them.
+        :param count: number of rows skipped.
+        :return: this query.
+        """
+        self._offset = count
+        return self
+
+    def after(self, **last_row):
+        """
+        Keyset pagination: restrict the next get() or iterate() to the rows
+        after the given one, according with order(). Without order() the rows
+        are ordered by the given fields, ascending.
+            query.order('name', '-id').limit(50).after(name='x', id=10)
+        :param last_row: values of the order fields into the last row read.
+        :return: this query.
+        """
+        self._after = normalize_db_values(last_row, self._obj)
+        return self
+
     def order(self, *args):
         """
         Insert a order by into the query.
-        :param args: ordering clauses.
+        :param args: ordering clauses, the fields names, or columns names,
+                     with a leading '-' for descending order.
         :return:
         """
         if len(args) > 0:
-            new_order = ' order by'
+            self._order_by = []
+            columns = self._obj._bf_objects_fields
             for column in args:
                 asc_desc = 'asc'
                 if column.startswith('-'):
                     asc_desc = 'desc'
                     column = column[1:]
-                new_order += ' {} {},'.format(
-                    self._obj.normalize_column(column), asc_desc)
-            self._order_by = new_order.strip(',')
+                self._order_by.append((columns.get(column, column),
+                                       asc_desc))
         return self
 
     def select(self, select_options, distinct=False):
@@ -169,6 +561,204 @@ class Query(object):
             self._obj.normalize_columns(select_options), self._obj.table_name)
         return self
 
+    def select_related(self, *fields):
+        """
+    Load the specified foreign fields into the same query, with LEFT JOINs,
+    instead of a query for each row. Only the first level of relations is
+    joined.
+    :param fields: names of ForeignField fields of the model.
+    :return:
+        """
+        self._related = list(fields)
+        return self
+
+    def update(self, values, **where_clauses):
+        """
+    Update all rows that match the specifieds clauses with a single command,
+    without load them.
+    :param values: dictionary as {field_name: new_value, ...}
+    :param where_clauses: clauses according with model fields.
+    :return: the number of updated rows.
+        """
+        if not values:
+            return 0
+        where_clauses = normalize_db_values(where_clauses, self._obj)
+        values = normalize_db_values(values, self._obj)
+        command = self._obj._bf_statement(
+            ('update', tuple(values), _shape(where_clauses)),
+            lambda: self._update_string(values, where_clauses))
+        params = dict(where_clauses)
+        for key, value in values.items():
+            params['bf_set_' + key] = value
+        connection = connect(self._obj.create_connection)
+        try:
+            return connection.command(command, params)
+        finally:
+            connection.close()
+            self._obj._bf_invalidate()
+
+    def _update_string(self, values, where_clauses):
+        """
+        Build the command of update().
+        """
+        to_set = ''
+        for key in values:
+            to_set += ' {}=%(bf_set_{})s,'.format(
+                self._obj.normalize_column(key), key)
+        return 'UPDATE {} SET{} WHERE{}'.format(
+            self._obj.table_name, to_set.strip(','),
+            self._where_string(where_clauses))
+
+    def _column(self, column_name, prefix=''):
+        """
+        Normalize a column, qualifying it with the table alias when given.
+        """
+        column = self._obj.normalize_column(column_name)
+        if prefix and not column_name.startswith('('):
+            return '{}.{}'.format(prefix, column)
+        return column
+
+    def _order_string(self, prefix=''):
+        """
+        Build the order by part of a query.
+        """
+        if not self._order_by:
+            return ''
+        return ' order by' + ','.join(
+            ' {} {}'.format(self._column(column, prefix), asc_desc)
+            for column, asc_desc in self._order_by)
+
+    def _related_string(self):
+        """
+        Build the select and from parts of a query that join the related
+        fields.
+        :return: the query string until the WHERE.
+        """
+        base = self._obj
+        columns = ['bf_0.{}'.format(base.normalize_column(column))
+                   for column in _columns(base)]
+        joins = ''
+        for count, name in enumerate(self._related, 1):
+            related = base._bf_field(name).create()
+            alias = 'bf_{}'.format(count)
+            columns += ['{}.{} AS "{}__{}"'.format(
+                alias, related.normalize_column(column), name, column)
+                for column in _columns(related)]
+            joins += ' LEFT JOIN {0} {1} ON bf_0.{2} = {1}.{3}'.format(
+                related.table_name, alias,
+                base.normalize_column(base._bf_objects_fields[name]),
+                related.normalize_column(related._get_primary_key()[0]))
+        return 'SELECT {} FROM {} bf_0{} WHERE '.format(
+            ', '.join(columns), base.table_name, joins)
+
+    def _where_string(self, where_clauses, prefix=''):
+        """
+        Build the where part of a query.
+        :param where_clauses: clauses already normalized by
+                              normalize_db_values.
+        :param prefix: alias of the table, when the query has joins.
+        :return: the where string.
+        """
+        if len(where_clauses) == 0:
+            return ' 1=1'
+        where = ''
+        for key in where_clauses.keys():
+            sep = '__'
+            if sep in key:
+                opt = key.split(sep)[-1]
+                if opt in self._where_opt:
+                    if where_clauses[key] is None and opt == 'not':
+                        where += ' {} is not %({})s AND'.format(
+                            self._column(key.split(sep + opt)[0], prefix),
+                            key)
+                    else:
+                        where += ' {} {} %({})s AND'.format(
+                            self._column(key.split(sep + opt)[0], prefix),
+                            self._where_opt[opt], key)
+                    continue
+            if where_clauses[key] is None:
+                where += ' {} is %({})s AND'.format(
+                    self._column(key, prefix), key)
+            else:
+                where += ' {} = %({})s AND'.format(
+                    self._column(key, prefix), key)
+        return where[0:len(where) - 4]
+
+    def _select_string(self, where_clauses, result_type):
+        """
+        Build the select query and reset the options used by it.
+        :param where_clauses: clauses according with model fields.
+        :param result_type: the requested result type.
+        :return: the query string, its bind variables, the result type and
+                 the page as (limit, offset), or None.
+        """
+        where_clauses = normalize_db_values(where_clauses, self._obj)
+        if self._custom_qry_init_part and \
+                result_type not in (T_TUPLE, T_COLUMNS):
+            result_type = T_DICT
+        if self._after and not self._order_by:
+            self._order_by = [(column, 'asc') for column in self._after]
+        elif self._after and sorted(self._after) != sorted(
+                column for column, _ in self._order_by):
+            self._reset_options()
+            raise BaseDBException('The keyset needs the value of each order '
+                                  'column!!!')
+        query = self._obj._bf_statement(
+            ('select', self._custom_qry_init_part, tuple(self._related),
+             tuple(self._order_by), _shape(where_clauses),
+             bool(self._after)),
+            lambda: self._build_select(where_clauses))
+        for key, value in self._after.items():
+            where_clauses['bf_after_' + key] = value
+        page = None
+        if self._limit is not None or self._offset:
+            page = self._limit, self._offset
+        self._reset_options()
+        return query, where_clauses, result_type, page
+
+    def _reset_options(self):
+        """
+        Clear the options used by a single select.
+        """
+        self._order_by = []
+        self._custom_qry_init_part = ''
+        self._limit = None
+        self._offset = 0
+        self._after = {}
+
+    def _build_select(self, where_clauses):
+        """
+        Build the select query from the current options.
+        """
+        prefix = ''
+        if self._custom_qry_init_part:
+            query = self._custom_qry_init_part
+        elif self._related:
+            query = self._related_string()
+            prefix = 'bf_0'
+        else:
+            query = self._qry_init_part
+        return query + self._where_string(where_clauses, prefix) + \
+            self._after_string(prefix) + self._order_string(prefix)
+
+    def _after_string(self, prefix=''):
+        """
+        Build the keyset condition of after(), as (a > x) OR (a = x AND b < y)
+        for order('a', '-b').
+        """
+        if not self._after:
+            return ''
+        terms = []
+        for position, (column, asc_desc) in enumerate(self._order_by):
+            parts = ['{} = %(bf_after_{})s'.format(
+                self._column(previous, prefix), previous)
+                for previous, _ in self._order_by[:position]]
+            parts.append('{} {} %(bf_after_{})s'.format(
+                self._column(column, prefix),
+                '<' if asc_desc == 'desc' else '>', column))
+            terms.append('({})'.format(' AND '.join(parts)))
+        return ' AND ({})'.format(' OR '.join(terms))
+
     def _populate(self, data):
         """
         Populate the resultset with data.
@@ -187,17 +777,69 @@ class Query(object):
         :return:
         """
 
-        new_reultset = []
-        columns = data[0]
-        rset = data[1]
-        for row in rset:
+        self._resultset = tuple(self._rows_dict(data[0], data[1],
+                                                result_type))
+
+    def _rows_dict(self, columns, rows, result_type=T_CLASS):
+        """
+        Convert query data into objects.
+        :param columns: the columns names.
+        :param rows: the query data.
+        :return: a list with models, dictionaries or named tuples.
+        """
+        if result_type == T_TUPLE:
+            return list(map(_row_class(tuple(columns))._make, rows))
+        new_rows = []
+        related = self._related if result_type == T_CLASS else ()
+        identity_map = current_identity_map() \
+            if result_type == T_CLASS else None
+        key_index = None
+        if identity_map is not None and self._obj._bf_primary_key_name:
+            key_column = self._obj._bf_objects_fields[
+                self._obj._bf_primary_key_name]
+            if key_column in columns:
+                key_index = columns.index(key_column)
+        for row in rows:
+            if key_index is not None:
+                obj = identity_map.get(self._obj.__class__, row[key_index])
+                if obj is not None:
+                    new_rows.append(obj)
+                    continue
             if result_type == T_CLASS:
+                data = dict(zip(columns, row))
+                for name in related:
+                    self._load_related(name, data)
                 obj = self._obj.__class__()
-                obj.load_data(dict(zip(columns, row)))
-                new_reultset.append(obj)
+                obj.load_data(data)
+                if identity_map is not None:
+                    obj = identity_map.add(obj)
+                new_rows.append(obj)
             else:
-                new_reultset.append(dict(zip(columns, row)))
-        self._resultset = tuple(new_reultset)
+                new_rows.append(dict(zip(columns, row)))
+        return new_rows
+
+    def _load_related(self, name, data):
+        """
+        Move the joined columns of a related field from data into its model.
+        :param name: the foreign field name.
+        :param data: dictionary as {column_name: value, ...}
+        """
+        prefix = name + '__'
+        related_data = {}
+        for key in [key for key in data if key.startswith(prefix)]:
+            related_data[key[len(prefix):]] = data.pop(key)
+        column = self._obj._bf_objects_fields[name]
+        if data.get(column) is not None:
+            field = self._obj._bf_field(name)
+            identity_map = current_identity_map()
+            related = None if identity_map is None \
+                else identity_map.get(field._bf_field_type, data[column])
+            if related is None:
+                related = field.create()
+                related.load_data(related_data)
+                if identity_map is not None:
+                    related = identity_map.add(related)
+            data[column] = related
 
     def __getitem__(self, item):
         return self._resultset[item]
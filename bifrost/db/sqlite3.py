@@ -15,19 +15,36 @@
 # You should have received a copy of the GNU General Public License
 # along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
 
+import re
 import sqlite3
+from functools import lru_cache
 
 from bifrost.db.basedb import BaseDB, BaseDBException
 
+_PYFORMAT = re.compile(r'%\((\w+)\)s')
+
+
+@lru_cache(maxsize=512)
+def named_style(query):
+    """
+Convert pyformat placeholders, as used by the models, to sqlite named style.
+    :param query: query string with %(name)s placeholders.
+    :return: query string with :name placeholders.
+    """
+    return _PYFORMAT.sub(r':\1', query)
+
 
 class SqliteDB(BaseDB):
     """
 Class for Sqlite database.
     :param db: database file.
+    :param cached_statements: number of compiled statements that sqlite3
+                              keeps by connection.
     """
 
-    def __init__(self, db):
+    def __init__(self, db, cached_statements=128):
         BaseDB.__init__(self)
+        self.cached_statements = cached_statements
         self._verify_connection(None, None, None, db)
 
     def _verify_connection(self, host, user, password, db=None):
@@ -35,7 +52,9 @@ Class for Sqlite database.
         Do the connection with the database.
         """
         try:
-            self.connection = sqlite3.connect(db)
+            self.connection = sqlite3.connect(
+                db, check_same_thread=False,
+                cached_statements=self.cached_statements)
             self.db = db
             self.is_valid = True
         except sqlite3.DatabaseError:
@@ -44,13 +63,26 @@ Class for Sqlite database.
             print(ee)
             self.is_valid = False
 
-    def _verify_field(self, field):
+    def _converter(self, type_code):
         """
-        Verify field value, and normalize if necessary.
+        Sqlite doesn't report the columns types and its values need no
+        conversion, the blobs already come as bytes.
         """
-        if isinstance(field, memoryview):
-            return field.tobytes()
-        return field
+        return None
+
+    def paginate(self, query, params, limit=None, offset=None):
+        """
+Restrict a query to a page of its rows, Sqlite only accept OFFSET after
+LIMIT.
+    :param query: query string to be restricted.
+    :param params: binding variables.
+    :param limit: maximum of rows, None for all.
+    :param offset: number of rows skipped.
+    :return: query string and binding variables of the page.
+        """
+        if offset and limit is None:
+            limit = -1
+        return BaseDB.paginate(self, query, params, limit, offset)
 
     def query(self, query, params=None):
         """
@@ -60,7 +92,7 @@ Execute a query into database.
     :return: array of tuples with query data.
         """
         try:
-            return self._query(query, params)
+            return self._query(named_style(query), params)
         except sqlite3.DatabaseError as e:
             print(e)
             raise e
@@ -77,7 +109,24 @@ Execute a query into database.
              on second an array of tuples with query data.
         """
         try:
-            return self._query_with_columns(query, params)
+            return self._query_with_columns(named_style(query), params)
+        except sqlite3.DatabaseError as e:
+            print(e)
+            raise e
+        except Exception as ee:
+            print(ee)
+            raise ee
+
+    def iterate(self, query, params=None, chunk_size=1000):
+        """
+Execute a query into database and yield its data in chunks.
+    :param query: query string to be executed.
+    :param params: binding variables.
+    :param chunk_size: number of rows fetched at time.
+    :return: generator of ([columns_names], [query_data]).
+        """
+        try:
+            yield from self._iterate(named_style(query), params, chunk_size)
         except sqlite3.DatabaseError as e:
             print(e)
             raise e
@@ -92,7 +141,78 @@ Execute a command into database.
     :param params: binding variables.
         """
         try:
-            return self._command(command, params)
+            return self._command(named_style(command), params)
+        except sqlite3.IntegrityError as e:
+            se = str(e)
+            if str(e).startswith('duplicate key value '
+                                 'violates unique constraint'):
+                raise BaseDBException('DUPLICATE KEY\n' + se)
+            else:
+                raise sqlite3.IntegrityError(se)
+        except sqlite3.DatabaseError as e:
+            print(e)
+            raise e
+        except Exception as ee:
+            print(ee)
+            raise ee
+
+    def command_many(self, command, seq_params):
+        """
+Execute a command into database once for each binding variables set.
+    :param command: command string to be executed.
+    :param seq_params: list of binding variables.
+        """
+        try:
+            return self._command_many(named_style(command), seq_params)
+        except sqlite3.IntegrityError as e:
+            se = str(e)
+            if str(e).startswith('duplicate key value '
+                                 'violates unique constraint'):
+                raise BaseDBException('DUPLICATE KEY\n' + se)
+            else:
+                raise sqlite3.IntegrityError(se)
+        except sqlite3.DatabaseError as e:
+            print(e)
+            raise e
+        except Exception as ee:
+            print(ee)
+            raise ee
+
+    def insert(self, command, params, primary_key):
+        """
+Execute an insert into database and return the generated key (the rowid).
+    :param command: insert string to be executed.
+    :param params: binding variables.
+    :param primary_key: primary key column name.
+    :return: the generated primary key.
+        """
+        try:
+            return self._insert(named_style(command), params, primary_key)
+        except sqlite3.IntegrityError as e:
+            se = str(e)
+            if str(e).startswith('duplicate key value '
+                                 'violates unique constraint'):
+                raise BaseDBException('DUPLICATE KEY\n' + se)
+            else:
+                raise sqlite3.IntegrityError(se)
+        except sqlite3.DatabaseError as e:
+            print(e)
+            raise e
+        except Exception as ee:
+            print(ee)
+            raise ee
+
+    def insert_many(self, command, seq_params, primary_key):
+        """
+Execute an insert into database once for each binding variables set.
+    :param command: insert string to be executed.
+    :param seq_params: list of binding variables.
+    :param primary_key: primary key column name.
+    :return: list with the generated primary keys.
+        """
+        try:
+            return self._insert_many(named_style(command), seq_params,
+                                     primary_key)
         except sqlite3.IntegrityError as e:
             se = str(e)
             if str(e).startswith('duplicate key value '
@@ -19,3 +19,4 @@
 from bifrost.models.fields import BoolField, BytesField, CharField, \
     DateField, DateTimeField, DecimalField, IntField, ForeignField, TimeField
 from bifrost.models.model import BaseModel, OracleModel
+from bifrost.models.session import Session
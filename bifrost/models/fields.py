@@ -19,6 +19,7 @@
 from datetime import datetime, date, time
 from decimal import Decimal
 
+from bifrost.db.cache import current_identity_map
 from bifrost.utils import T_NONE
 
 
@@ -39,6 +40,9 @@ class NotSetValue(object):
     pass
 
 
+_NOT_CACHED = NotSetValue()
+
+
 class BaseField(object):
     """
     Base class for all fields.
@@ -46,6 +50,10 @@ class BaseField(object):
     :param null:
     """
 
+    # (array.array typecode, numpy dtype) of the field values into a
+    # columnar query result, None to keep them as Python objects.
+    _bf_column_type = None
+
     def __init__(self, field_name=None, null=False, primary_key=False,
                  default_value=NotSetValue(), choices=None, display=None):
         self._bf_field_name = field_name
@@ -53,6 +61,7 @@ class BaseField(object):
         self._bf_default_value = default_value
         self._bf_primary_key = primary_key
         self._bf_display = display
+        self._bf_display_cache = _NOT_CACHED
         self._bf_value = None
         self._bf_choices = choices
         if not isinstance(default_value, NotSetValue):
@@ -69,7 +78,25 @@ class BaseField(object):
         Try set value to this field.
         :param value:
         """
-        self._bf_value = self.custom_validation(self._bf_field_validate(value))
+        self._bf_value = self.validate(value)
+        self._bf_display_cache = _NOT_CACHED
+
+    def validate(self, value):
+        """
+        Validate a value without set it to this field.
+        :param value:
+        :return: the value normalized as it would be stored.
+        """
+        return self.custom_validation(self._bf_field_validate(value))
+
+    def format(self, value):
+        """
+        Format a value as this field displays it.
+        :param value:
+        """
+        if self._bf_display and value is not None:
+            return self._bf_display(value)
+        return value
 
     def _bf_field_validate(self, value):
         return self._bf_validate(value)
@@ -95,12 +122,14 @@ class BaseField(object):
     @property
     def display(self):
         """
-        The format that the value will be displayed.
+        The format that the value will be displayed, kept until the value
+        changes.
         """
-        if self._bf_display and self._bf_value is not None:
-            return self._bf_display(self.value)
-        else:
-            return self.value
+        if self._bf_display is None:
+            return self._bf_value
+        if self._bf_display_cache is _NOT_CACHED:
+            self._bf_display_cache = self.format(self._bf_value)
+        return self._bf_display_cache
 
     @property
     def field_name(self):
@@ -129,6 +158,8 @@ class BoolField(BaseField):
     Class for boolean fields
     """
 
+    _bf_column_type = ('b', 'bool')
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
@@ -200,6 +231,8 @@ class DateField(BaseField):
     Class for date fields
     """
 
+    _bf_column_type = (None, 'datetime64[D]')
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
@@ -228,6 +261,8 @@ class DateTimeField(BaseField):
     Class for datetime fields
     """
 
+    _bf_column_type = (None, 'datetime64[us]')
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
@@ -254,6 +289,8 @@ class DecimalField(BaseField):
     Class for decimal fields
     """
 
+    _bf_column_type = ('d', 'float64')
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
@@ -272,38 +309,143 @@ class DecimalField(BaseField):
 class ForeignField(BaseField):
     """
     Class for Foreign Key fields
+    :param field_type: the related model class.
+    :param lazy: keep only the key and load the related model when accessed.
     """
 
-    def __init__(self, field_type, **kwargs):
+    def __init__(self, field_type, lazy=False, **kwargs):
         super().__init__(**kwargs)
         self._bf_field_type = field_type
+        self._bf_lazy = lazy
         self._bf_null = False
-        self._bf_value = field_type()
+        self._bf_value = None if lazy else field_type()
 
     def create(self):
         return self._bf_field_type()
 
+    def related(self, key):
+        """
+        Return the related model with the primary key, from the active
+        identity map or loaded from the database.
+        :param key: the primary key value.
+        :return: the related model. :raise FieldException:
+        """
+        identity_map = current_identity_map()
+        if identity_map is not None:
+            model = identity_map.get(self._bf_field_type, key)
+            if model is not None:
+                return model
+        model = self._bf_field_type()
+        model.load(key)
+        if model.is_new:
+            raise FieldException('This field only accept models values.'
+                                 ' Trying set ({}){}'.format(type(key), key))
+        return model
+
     def custom_validation(self, value):
         value = super(ForeignField, self)._bf_validate(value)
+        if isinstance(value, LazyModel):
+            return value
         try:
             table = value._bf_table_name
         except AttributeError:
-            tmp = self._bf_field_type()
-            tmp.load(value)
-            if tmp.is_new:
-                raise FieldException('This field only accept models values.'
-                                     ' Trying set ({}){}'.format(type(value),
-                                                                 value))
-            else:
-                value = tmp
+            if self._bf_lazy:
+                return LazyModel(self._bf_field_type, value)
+            value = self.related(value)
         return value
 
 
+class LazyModel(object):
+    """
+    Stand-in for a related model, loaded only when an attribute other than
+    its primary key is accessed. A copy holds only the key, not loaded yet.
+    :param model_type: the related model class.
+    :param key: the primary key value.
+    """
+
+    __slots__ = ('_bf_key', '_bf_model', '_bf_model_type')
+
+    def __init__(self, model_type, key):
+        object.__setattr__(self, '_bf_key', key)
+        object.__setattr__(self, '_bf_model', None)
+        object.__setattr__(self, '_bf_model_type', model_type)
+
+    def bf_load(self):
+        """
+        Load the related model, only in the first call.
+        :return: the related model.
+        """
+        if self._bf_model is None:
+            identity_map = current_identity_map()
+            model = None if identity_map is None \
+                else identity_map.get(self._bf_model_type, self._bf_key)
+            if model is None:
+                model = self._bf_model_type()
+                model.load(self._bf_key)
+            if model.is_new:
+                raise FieldException('Related object not found.'
+                                     ' Key: {}'.format(self._bf_key))
+            object.__setattr__(self, '_bf_model', model)
+        return self._bf_model
+
+    def _get_primary_key(self):
+        """
+        Get primary key data without loading the model.
+        :return: a list as [primary_key_db_name, primary_key_value]
+        """
+        return _primary_key(self._bf_model_type)[1], self._bf_key
+
+    @property
+    def _bf_primary_key_name(self):
+        return _primary_key(self._bf_model_type)[0]
+
+    @property
+    def is_loaded(self):
+        """
+        If the related model was already loaded.
+        """
+        return self._bf_model is not None
+
+    def __getattr__(self, item):
+        if item.startswith('_bf_') or item.startswith('__'):
+            raise AttributeError(item)
+        if self._bf_model is None and \
+                item == _primary_key(self._bf_model_type)[0]:
+            return self._bf_key
+        return getattr(self.bf_load(), item)
+
+    def __setattr__(self, key, value):
+        if key in LazyModel.__slots__:
+            object.__setattr__(self, key, value)
+        else:
+            setattr(self.bf_load(), key, value)
+
+    def __reduce__(self):
+        return LazyModel, (self._bf_model_type, self._bf_key)
+
+    def __repr__(self):
+        return '<Lazy({}: {})>'.format(self._bf_model_type.__name__,
+                                       self._bf_key)
+
+
+def _primary_key(model_type):
+    """
+    Return the primary key field and column names of a model class, from the
+    fields metadata of the class.
+    """
+    from bifrost.models.model import model_info
+    info = model_info(model_type)
+    return info.primary_key_name, info.objects_fields.get(
+        info.primary_key_name)
+
+
 class IntField(BaseField):
     """
     Class for text fields
     """
 
+    _bf_column_type = ('q', 'int64')
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
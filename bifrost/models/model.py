@@ -15,22 +15,234 @@
 # You should have received a copy of the GNU General Public License
 # along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
 
-from bifrost.db.basedb import BaseDBException, NoConnection
-from bifrost.db.query import Query
-from bifrost.models.fields import BaseField, ForeignField, FieldException
+import weakref
+from types import FunctionType
+
+from bifrost.db.aio import run
+from bifrost.db.basedb import BaseDBException, NoConnection, bound, \
+    connect
+from bifrost.db.cache import StatementCache, current_identity_map
+from bifrost.models.fields import BaseField, ForeignField, FieldException, \
+    LazyModel
 from bifrost.utils import ObjectNotSavedException, replace_when_none, \
     normalize_db_values
 
 
-class BaseModel(object):
-    """ Base class for all objects that involves databases. """
+class ModelInfo(object):
+    """
+    Fields metadata of a model class, computed by the first object of the
+    class that calls bf_prepare(), or when the class is created for compact
+    models, and shared by all its objects. While builder references that first
+    object, each bf_prepare() of it looks for fields created since the last
+    one.
+    The SQL compiled for the class is kept into statements, a StatementCache
+    with hit and miss counters.
+    :param fields: dictionary as {field_name: field, ...}
+    :param compact: if the fields are declared into the class body.
+    """
+
+    def __init__(self, fields, compact=False):
+        self.builder = None
+        self.compact = compact
+        self.fields = tuple(fields)
+        self.fields_objects = {}
+        self.objects_fields = {}
+        self.primary_key_name = ''
+        self.foreign_fields = tuple(name for name in fields
+                                    if isinstance(fields[name], ForeignField))
+        for field in fields:
+            if fields[field]._bf_primary_key:
+                self.primary_key_name = field
+            self.objects_fields[field] = replace_when_none(
+                fields[field].field_name, field)
+            self.fields_objects[
+                replace_when_none(fields[field].field_name, field)] = field
+        self.columns = tuple(self.objects_fields[name]
+                             for name in self.fields)
+        self.index = {name: index for index, name in enumerate(self.fields)}
+        self.statements = StatementCache()
+        self.templates = dict(fields) if compact else {}
+        self.initial_values = tuple(
+            None if isinstance(fields[name], ForeignField)
+            else fields[name].value for name in self.fields) \
+            if compact else ()
+
+
+def model_info(cls):
+    """
+    Return the fields metadata of a model class, creating one object of the
+    class when it wasn't computed yet.
+    :param cls: the model class.
+    :return: a ModelInfo.
+    """
+    info = cls.__dict__.get('_bf_info')
+    if info is None:
+        cls().bf_prepare()
+        info = cls.__dict__['_bf_info']
+    return info
+
+
+class SlotField(object):
+    """
+    Descriptor of a field declared into a compact model. The field stays into
+    the class and each object stores only the value, into _bf_values. The
+    display of the last value read is kept, so reading again the same value
+    doesn't format it again.
+    :param index: position of the value into _bf_values.
+    :param field: the field declared into the class.
+    """
+
+    __slots__ = ('index', 'field', 'display', 'cache')
+
+    def __init__(self, index, field):
+        self.index = index
+        self.field = field
+        self.display = field._bf_display
+        self.cache = (None, None)
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self.field
+        value = obj._bf_values[self.index]
+        if self.display is None or value is None:
+            return value
+        cache = self.cache
+        if cache[0] is not value:
+            cache = self.cache = (value, self.display(value))
+        return cache[1]
+
+    def __set__(self, obj, value):
+        obj._bf_set_value(self.index, self.field.validate(value))
+
+
+class InstanceField(object):
+    """
+    Descriptor of a field created into __init__. The field object stays into
+    the object __dict__, the descriptor turns the attribute access into the
+    field display and the assignment into a validated set.
+    :param name: the field name.
+    """
+
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        try:
+            return obj.__dict__[self.name].display
+        except KeyError:
+            raise AttributeError(self.name)
+
+    def __set__(self, obj, value):
+        field = obj.__dict__.get(self.name)
+        if field is None:
+            obj.__dict__[self.name] = value
+        else:
+            field.try_set(value)
+            obj._bf_changed |= 1 << obj._bf_info.index[self.name]
+
+
+def _setattr_unprepared(obj, key, value):
+    """
+    __setattr__ of the models with fields created into __init__, until the
+    class is prepared: the assignment to a field without descriptor yet sets
+    the field value instead of replacing the field.
+    """
+    field = obj.__dict__.get(key)
+    if isinstance(field, BaseField) and \
+            not isinstance(getattr(type(obj), key, None), InstanceField):
+        field.try_set(value)
+    else:
+        object.__setattr__(obj, key, value)
+
+
+class ModelMeta(type):
+    """
+    Metaclass of the models. When fields are declared into the class body,
+    instead of into __init__, the model is compact: its objects have no
+    __dict__ and keep only the fields values. Otherwise the class sets the
+    fields through _setattr_unprepared() until its second object is prepared.
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        declared = {key: value for key, value in namespace.items()
+                    if isinstance(value, BaseField)}
+        fields = {}
+        for base in reversed(bases):
+            info = getattr(base, '_bf_info', None)
+            if info is not None and info.compact:
+                fields.update(info.templates)
+        if not declared and not fields:
+            if any(isinstance(base, ModelMeta) for base in bases):
+                namespace.setdefault('__setattr__', _setattr_unprepared)
+            return super().__new__(mcs, name, bases, namespace)
+        fields.update(declared)
+        for key in declared:
+            del namespace[key]
+        namespace.setdefault('__slots__', ())
+        namespace.setdefault('_bf_table_name', name)
+        if isinstance(namespace.get('create_connection'), FunctionType):
+            namespace['create_connection'] = staticmethod(
+                namespace['create_connection'])
+        cls = super().__new__(mcs, name, bases, namespace)
+        info = ModelInfo(fields, compact=True)
+        cls._bf_info = info
+        cls._bf_compact = True
+        cls._bf_fields_objects = info.fields_objects
+        cls._bf_objects_fields = info.objects_fields
+        cls._bf_primary_key_name = info.primary_key_name
+        for index, key in enumerate(info.fields):
+            setattr(cls, key, SlotField(index, fields[key]))
+        return cls
+
+
+class BaseModel(object, metaclass=ModelMeta):
+    """
+    Base class for all objects that involves databases.
+
+    The fields can be created into __init__, followed by bf_prepare(), or
+    declared into the class body. Models declared into the class body are
+    compact, their objects store only the values and use far less memory.
+
+    The fields assigned since the object was loaded or saved are tracked, an
+    update sets only them, finding the row by the primary key. Set
+    bf_check_concurrency to also require that the row still has the loaded
+    values of those fields, otherwise the save fails.
+
+    Set bf_result_cache with a ResultCache to cache the results of the
+    queries of the model, the writes done through the model invalidate them.
+    The queries done into a transaction(), that can see uncommitted rows,
+    don't use the cache.
+    """
+
+    __slots__ = ('_bf_is_new', '_bf_changed', '_bf_values', '_bf_old_values',
+                 '__weakref__')
+
+    _bf_compact = False
+    bf_check_concurrency = False
+    bf_result_cache = None
+    create_connection = NoConnection
 
     def __init__(self):
-        self._bf_fields_objects = {}
         self._bf_is_new = True
-        self._bf_objects_fields = {}
+        self._bf_changed = 0
+        if self._bf_compact:
+            self._bf_values = list(self._bf_info.initial_values)
+            self._bf_old_values = None
+            return
+        info = self.__class__.__dict__.get('_bf_info')
+        if info is None:
+            self._bf_fields_objects = {}
+            self._bf_objects_fields = {}
+            self._bf_primary_key_name = ''
+        else:
+            self._bf_fields_objects = info.fields_objects
+            self._bf_objects_fields = info.objects_fields
+            self._bf_primary_key_name = info.primary_key_name
         self._bf_old_data = {}
-        self._bf_primary_key_name = ''
         self._bf_table_name = self.__class__.__name__
         self.create_connection = NoConnection
 
@@ -38,26 +250,51 @@ class BaseModel(object):
         """
         Return a dict with all Bifrost fields from the class.
         """
+        info = self.__class__.__dict__.get('_bf_info')
+        if info is not None and info.builder is None:
+            if info.compact:
+                return dict(info.templates)
+            fields = self.__dict__
+            return {key: fields[key] for key in info.fields}
         to_return = {}
-        for key in self.__dict__:
-            tmp = super(BaseModel, self).__getattribute__(key)
+        for key, tmp in self.__dict__.items():
             if isinstance(tmp, BaseField):
                 to_return[key] = tmp
         return to_return
 
     def bf_prepare(self):
         """
-        Prepare the object as a Bifrost model's
+        Prepare the object as a Bifrost model's. The fields are discovered
+        only by the first object of the class, until another object is
+        prepared, so a subclass can create more fields after the __init__ of
+        its parent and call bf_prepare() again. All objects of a class need
+        have the same fields.
         :return: None
         """
-        fields = self.bf_get_all_fields()
-        for field in fields:
-            if fields[field]._bf_primary_key:
-                self._bf_primary_key_name = field
-            self._bf_objects_fields[field] = replace_when_none(
-                fields[field].field_name, field)
-            self._bf_fields_objects[
-                replace_when_none(fields[field].field_name, field)] = field
+        if self._bf_compact:
+            return
+        cls = self.__class__
+        info = cls.__dict__.get('_bf_info')
+        if info is not None and info.builder is not None \
+                and info.builder() is not self:
+            info.builder = None
+            if cls.__dict__.get('__setattr__') is _setattr_unprepared:
+                del cls.__setattr__
+                if cls.__setattr__ is _setattr_unprepared:
+                    cls.__setattr__ = object.__setattr__
+        if info is None or info.builder is not None:
+            fields = self.bf_get_all_fields()
+            if info is None or any(name not in info.index
+                                   for name in fields):
+                info = ModelInfo(fields)
+                info.builder = weakref.ref(self)
+                for name in info.fields:
+                    if not isinstance(cls.__dict__.get(name), InstanceField):
+                        setattr(cls, name, InstanceField(name))
+                cls._bf_info = info
+        self._bf_fields_objects = info.fields_objects
+        self._bf_objects_fields = info.objects_fields
+        self._bf_primary_key_name = info.primary_key_name
 
     def load(self, pk):
         """
@@ -66,38 +303,67 @@ class BaseModel(object):
         """
 
         primary_key = self._get_primary_key()
+        identity_map = current_identity_map()
+        if primary_key and identity_map is not None:
+            loaded = identity_map.get(self.__class__, pk)
+            if loaded is not None and loaded is not self:
+                self.load_data({
+                    loaded._bf_objects_fields[name]: loaded._bf_get(name)
+                    for name in loaded._bf_info.fields})
+                return
         if primary_key:
-            connection = self.create_connection()
-            result = connection.query_with_columns(
-                '{0} "{1}" = %({1})s'.format(self.qry_init_part,
-                                             primary_key[0]),
-                {primary_key[0]: pk})
-            if len(result) > 0:
+            connection = connect(self.create_connection)
+            try:
+                result = connection.query_with_columns(
+                    self._bf_statement(('load',), lambda: '{0} "{1}" = '
+                                       '%({1})s'.format(self.qry_init_part,
+                                                        primary_key[0])),
+                    {primary_key[0]: pk})
+            finally:
+                connection.close()
+            if len(result[1]) > 0:
                 self.load_data(dict(zip(result[0], result[1][0])))
-            connection.close()
+                if identity_map is not None:
+                    identity_map.add(self)
             self.on_load()
 
+    async def aload(self, pk):
+        """
+        Load a object where field_primary_key = pk, without blocking the
+        event loop.
+        :param pk: the primary key value.
+        """
+        await run(self.load, pk)
+
     def load_data(self, data):
 
         """
         Fill the object with your data .
         :param data: dictionary as {column_name: value, ...}
         """
-        self._bf_old_data.clear()
+        if self._bf_compact:
+            self._bf_values = list(self._bf_values)
+        else:
+            self._bf_old_data.clear()
         for key in data:
             try:
                 obj_name = self._bf_fields_objects[key]
-                tmp = super(BaseModel, self).__getattribute__(obj_name)
-                if isinstance(tmp, ForeignField):
-                    cls = tmp.create()
-                    query = Query(cls)
-                    query.get(**{cls._bf_primary_key_name: data[key]})
-                    tmp.try_set(query[0])
+                tmp = self._bf_field(obj_name)
+                value = data[key]
+                if isinstance(value, BaseModel):
+                    self._bf_set(obj_name, value)
+                    value = value._get_primary_key()[1]
+                elif isinstance(tmp, ForeignField) and not tmp._bf_lazy:
+                    self._bf_set(obj_name, tmp.related(value))
                 else:
-                    tmp.try_set(data[key])
-                self._bf_old_data['__bf_old__' + key] = data[key]
+                    self._bf_set(obj_name, value)
+                if not self._bf_compact:
+                    self._bf_old_data['__bf_old__' + key] = value
             except FieldException as ex:
                 raise FieldException('Field {}: {}'.format(key, ex))
+        if self._bf_compact:
+            self._bf_old_values = self._bf_values
+        self._bf_changed = 0
         self._bf_is_new = False
         self.on_load()
 
@@ -143,49 +409,223 @@ class BaseModel(object):
 
     def save(self):
         """
-        Save data to the database.
+        Save data to the database. A loaded object is updated only when some
+        field was changed, and only the changed fields are sent.
         :raise ObjectNotSavedException:
         """
-        connection = self.create_connection()
-        command = self._save_string()
-        data = normalize_db_values(self._data_dict(), self)
-        data.update(normalize_db_values(self._bf_old_data))
+        primary_key = self._get_primary_key()
+        if self._bf_is_new:
+            command = self._bf_statement(('insert',), self._insert_string)
+            data = normalize_db_values(self._data_dict(), self)
+            where = {}
+        else:
+            data = normalize_db_values(self._changed_data(), self)
+            if not data:
+                return
+            columns = tuple(data)
+            where = self._update_params(columns)
+            command = self._bf_statement(
+                ('update', columns, tuple((key, where[key] is None)
+                                          for key in where)),
+                lambda: self._update_string(columns, where))
+            data.update(where)
+        connection = connect(self.create_connection)
         try:
-            connection.command(command, data)
+            if self._bf_is_new and primary_key:
+                self._set_primary_key(
+                    connection.insert(command, data, primary_key[0]))
+            else:
+                count = connection.command(command, data)
+                if where and self.bf_check_concurrency and count == 0:
+                    raise ObjectNotSavedException(
+                        'Object changed by another transaction.')
         except BaseDBException as err:
             if str(err).startswith('DUPLICATE KEY'):
                 raise ObjectNotSavedException('Duplicated Item.')
-        connection.close()
-        if self._bf_is_new:
-            self._load_id_by_all_fields()
-        self._bf_is_new = False
+        finally:
+            connection.close()
+            self._bf_invalidate()
+        self._bf_saved()
         self.on_save()
 
+    async def asave(self):
+        """
+        Save data to the database without blocking the event loop, see
+        save().
+        :raise ObjectNotSavedException:
+        """
+        await run(self.save)
+
+    @classmethod
+    def bulk_save(cls, objects, batch_size=1000):
+        """
+        Insert new objects into the database in batches, compiling the insert
+        string once and doing a single commit per batch.
+        :param objects: iterable with new objects of this model.
+        :param batch_size: number of rows sent by each batch.
+        :return: the number of inserted objects.
+        :raise ObjectNotSavedException:
+        """
+        command = None
+        connection = None
+        batch = []
+        count = 0
+        try:
+            for obj in objects:
+                if not obj._bf_is_new:
+                    raise ObjectNotSavedException(
+                        'Only new objects can be bulk saved.')
+                if command is None:
+                    command = obj._bf_statement(('insert',),
+                                                obj._insert_string)
+                    connection = connect(obj.create_connection)
+                batch.append(obj)
+                if len(batch) >= batch_size:
+                    count += cls._bulk_insert(connection, command, batch)
+                    batch = []
+            if batch:
+                count += cls._bulk_insert(connection, command, batch)
+        finally:
+            if connection is not None:
+                connection.close()
+                obj._bf_invalidate()
+        return count
+
+    @classmethod
+    async def abulk_save(cls, objects, batch_size=1000):
+        """
+        Insert new objects into the database in batches without blocking the
+        event loop, see bulk_save().
+        :return: the number of inserted objects.
+        """
+        return await run(cls.bulk_save, objects, batch_size)
+
+    @staticmethod
+    def _bulk_insert(connection, command, batch):
+        """
+        Send a batch of new objects to the database.
+        :return: the number of inserted objects.
+        """
+        rows = [normalize_db_values(obj._data_dict(), obj) for obj in batch]
+        primary_key = batch[0]._get_primary_key()
+        try:
+            if primary_key:
+                keys = connection.insert_many(command, rows, primary_key[0])
+            else:
+                connection.command_many(command, rows)
+                keys = ()
+        except BaseDBException as err:
+            if str(err).startswith('DUPLICATE KEY'):
+                raise ObjectNotSavedException('Duplicated Item.')
+            raise
+        for obj, key in zip(batch, keys):
+            obj._set_primary_key(key)
+        for obj in batch:
+            obj._bf_saved()
+            obj.on_save()
+        return len(batch)
+
     def _data_dict(self, with_primary_key=False):
         """ Return adictionary with bind variables and yours values. """
-        fields = self.bf_get_all_fields()
         data = {}
-        if self._bf_primary_key_name and not with_primary_key:
-            fields.pop(self._bf_primary_key_name)
-        for key in fields:
-            value = fields[key].value
+        for key in self._bf_info.fields:
+            if key == self._bf_primary_key_name and not with_primary_key:
+                continue
+            value = self._bf_get(key)
             if isinstance(value, BaseModel):
-                value = value.__getattribute__(value._bf_primary_key_name)
+                value = value._get_primary_key()[1]
+            elif isinstance(value, LazyModel):
+                value = value._get_primary_key()[1]
             data[key] = value
         return data
 
+    def _changed_data(self):
+        """
+        Return a dictionary with the fields changed since loaded or saved.
+        """
+        changed = self._bf_changed
+        return {key: value for key, value in self._data_dict().items()
+                if changed >> self._bf_info.index[key] & 1}
+
+    def _bf_saved(self):
+        """
+        Take the current values as the loaded ones, after a save.
+        """
+        self._bf_changed = 0
+        self._bf_is_new = False
+        if self._bf_compact:
+            self._bf_old_values = self._bf_values
+        else:
+            self._bf_old_data = {
+                '__bf_old__' + key: value for key, value in
+                normalize_db_values(self._data_dict(with_primary_key=True),
+                                    self).items()}
+
     def _get_primary_key(self):
         """
         Get primary key data.
         :return: a list as [primary_key_db_name, primary_key_value]
         """
         if self._bf_primary_key_name:
-            tmp = super(BaseModel,
-                        self).__getattribute__(self._bf_primary_key_name)
-            return replace_when_none(tmp.field_name,
-                                     self._bf_primary_key_name), tmp.value
+            return self._bf_objects_fields[self._bf_primary_key_name], \
+                self._bf_get(self._bf_primary_key_name)
         return None
 
+    def _set_primary_key(self, value):
+        """
+        Set the primary key value generated by the database.
+        :param value: the primary key value.
+        """
+        self._bf_set(self._bf_primary_key_name, value)
+
+    def _bf_field(self, name):
+        """
+        Return the field object of a field name.
+        """
+        if self._bf_compact:
+            return self._bf_info.templates[name]
+        return self.__dict__[name]
+
+    def _bf_get(self, name):
+        """
+        Return the value, without formatting, of a field.
+        """
+        if self._bf_compact:
+            return self._bf_values[self._bf_info.index[name]]
+        return self.__dict__[name].value
+
+    def _bf_set(self, name, value):
+        """
+        Validate and set the value of a field.
+        """
+        if self._bf_compact:
+            self._bf_set_value(self._bf_info.index[name],
+                               self._bf_info.templates[name].validate(value))
+        else:
+            self.__dict__[name].try_set(value)
+            self._bf_changed |= 1 << self._bf_info.index[name]
+
+    def _bf_set_value(self, index, value):
+        """
+        Set an already validated value of a compact model, copying the values
+        first when they are still shared with the loaded ones.
+        """
+        if self._bf_old_values is self._bf_values:
+            self._bf_values = list(self._bf_values)
+        self._bf_values[index] = value
+        self._bf_changed |= 1 << index
+
+    def _old_data(self):
+        """
+        Return the loaded values as bind variables {__bf_old__column: value}.
+        """
+        if not self._bf_compact:
+            return self._bf_old_data
+        if self._bf_old_values is None:
+            return {}
+        return {'__bf_old__' + column: value for column, value in
+                zip(self._bf_info.columns, self._bf_old_values)}
+
     def _insert_string(self):
 
         """ Return the insert string. """
@@ -194,39 +634,53 @@ class BaseModel(object):
             self._bf_table_name, '"{}"'.format('", "'.join(keys)),
             '%({})s'.format(')s, %('.join(keys)))
 
-    def _load_id_by_all_fields(self):
-
+    def _bf_invalidate(self):
         """
-        Load a id from this object values.
-         """
-        if self._bf_primary_key_name:
-            qry = Query(self)
-
-            qry.get(**self._data_dict())
-            if len(qry) > 0:
-                tmp = qry[0]
-                super(BaseModel, self).__setattr__(
-                    self._bf_primary_key_name,
-                    tmp.__dict__[self._bf_primary_key_name])
-
-    def _save_string(self):
-
-        """ Return the save [insert or update] string. """
+        Invalidate the cached results of the model table, after a write.
+        Inside a transaction they are invalidated again at its end.
+        """
+        cache = self.bf_result_cache
+        if cache is not None:
+            cache.invalidate(self._bf_table_name)
+            connection = bound(self.create_connection)
+            if connection is not None and connection.in_transaction:
+                connection.invalidate_on_end(cache, self._bf_table_name)
 
-        if self._bf_is_new:
-            return self._insert_string()
-        else:
-            return self._update_string()
+    def _bf_statement(self, key, build):
+        """
+        Return a statement from the statements cache of the class.
+        :param key: description of the statement shape.
+        :param build: callable that compile the statement on a miss.
+        """
+        return self._bf_info.statements.get(key, build)
 
-    def _update_string(self):
+    def _update_params(self, columns):
+        """
+        Return the bind variables of the update WHERE: the primary key, plus
+        the loaded values of the changed columns with bf_check_concurrency.
+        Models without primary key are found by all the loaded values.
+        :param columns: the changed columns.
+        """
+        old_data = normalize_db_values(self._old_data())
+        primary_key = self._get_primary_key()
+        if not primary_key:
+            return old_data
+        key = '__bf_old__' + primary_key[0]
+        params = {key: old_data.get(key, primary_key[1])}
+        if self.bf_check_concurrency:
+            for column in columns:
+                params['__bf_old__' + column] = \
+                    old_data.get('__bf_old__' + column)
+        return params
+
+    def _update_string(self, columns, where_params):
         """ Return the update string. """
-        keys = normalize_db_values(self._data_dict(), self).keys()
         to_set = ''
         where = ''
-        for key in keys:
+        for key in columns:
             to_set += ' {}=%({})s,'.format(self.normalize_column(key), key)
-        for key in self._bf_old_data:
-            if self._bf_old_data[key] is None:
+        for key in where_params:
+            if where_params[key] is None:
                 where += ' {} is %({})s AND'.format(self.normalize_column(
                     key.replace('__bf_old__', '', 1)), key)
             else:
@@ -234,7 +688,7 @@ class BaseModel(object):
                     key.replace('__bf_old__', '', 1)), key)
         cmd = 'UPDATE {} SET {} WHERE {}'.format(self._bf_table_name,
                                                  to_set.strip(','),
-                                                 where.strip('AND'))
+                                                 where[:-4])
         return cmd
 
     @property
@@ -261,11 +715,10 @@ class BaseModel(object):
     @property
     def qry_init_part(self):
         """ Build the query string for select. """
-        keys = normalize_db_values(self._data_dict(with_primary_key=True),
-                                   self).keys()
-        text = 'SELECT {} FROM {} WHERE '.format(
-            '"{}"'.format('", "'.join(keys)), self._bf_table_name)
-        return text
+        keys = self._bf_info.columns
+        return self._bf_statement(
+            ('qry_init_part',), lambda: 'SELECT {} FROM {} WHERE '.format(
+                '"{}"'.format('", "'.join(keys)), self._bf_table_name))
 
     @property
     def table_name(self):
@@ -274,24 +727,9 @@ class BaseModel(object):
         """
         return self._bf_table_name
 
-    def __getattribute__(self, item):
-        tmp = super(BaseModel, self).__getattribute__(item)
-        if isinstance(tmp, BaseField):
-            return tmp.display
-        else:
-            return tmp
-
     def __repr__(self):
         return '<Model({})>'.format(self.__str__())
 
-    def __setattr__(self, key, value):
-        if key in self.__dict__ and \
-                isinstance(self.__dict__[key], BaseField):
-            tmp = super(BaseModel, self).__getattribute__(key)
-            tmp.try_set(value)
-        else:
-            super(BaseModel, self).__setattr__(key, value)
-
     def __str__(self):
         text = ''
         data = self._data_dict(with_primary_key=True)
@@ -314,6 +752,8 @@ class BaseModel(object):
 class OracleModel(BaseModel):
     """ Base class for all objects that involves Oracle databases. """
 
+    __slots__ = ()
+
     def __init__(self):
         BaseModel.__init__(self)
 
@@ -324,14 +764,16 @@ class OracleModel(BaseModel):
         """
         primary_key = self._get_primary_key()
         if primary_key:
-            connection = self.create_connection()
-            result = connection.query(
-                '{0} {1} = :{1}'.format(self.qry_init_part,
-                                        primary_key[0]),
-                {primary_key[0]: primary_key[1].value})
+            connection = connect(self.create_connection)
+            try:
+                result = connection.query(
+                    '{0} {1} = :{1}'.format(self.qry_init_part,
+                                            primary_key[0]),
+                    {primary_key[0]: primary_key[1].value})
+            finally:
+                connection.close()
             if len(result) > 0:
                 self.load_data(result[0])
-            connection.close()
             self.on_load()
 
     def normalize_column(self, column_name):
@@ -366,14 +808,17 @@ class OracleModel(BaseModel):
             self._bf_table_name, '"{}"'.format('", "'.join(keys)),
             ':{}'.format(', :'.join(keys)))
 
-    def _update_string(self):
+    def _update_string(self, columns, where_params):
         """ Return the update string. """
-        keys = self._data_dict().keys()
         cmd = 'UPDATE {} SET'.format(self._bf_table_name)
-        for key in keys:
+        for key in columns:
             cmd += ' "{0}"=:{0},'.format(key)
-        cmd = '{} WHERE '.format(cmd.strip(','))
-        return cmd
+        cmd = '{} WHERE'.format(cmd.strip(','))
+        for key in where_params:
+            cmd += ' "{}" {} :{} AND'.format(
+                key.replace('__bf_old__', '', 1),
+                'is' if where_params[key] is None else '=', key)
+        return cmd[:-4]
 
     @property
     def qry_init_part(self):
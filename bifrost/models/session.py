@@ -0,0 +1,145 @@
+# Copyright (C) 2015 Clemente Junior
+#
+# This file is part of BifrostDB
+#
+# BifrostDB is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+
+from bifrost.db.basedb import transaction
+from bifrost.db.cache import IdentityMap
+from bifrost.models.model import BaseModel
+
+
+class Session(object):
+    """
+    Unit of work: keep the objects to be saved and flush them together into a
+    single transaction, parents before the objects that reference them by a
+    ForeignField. The new objects of a model are inserted in batches.
+    The models and queries that use the same connection factory take part
+    into the transaction while the session block runs, and the session
+    identity map keeps one object per primary key loaded into the block.
+
+        with Session(pool) as session:
+            session.add(customer, order)
+
+    :param create_connection: the connection factory of the models.
+    """
+
+    def __init__(self, create_connection):
+        self.create_connection = create_connection
+        self._pending = []
+        self._pending_ids = set()
+        self._transaction = None
+        self.connection = None
+        self.identity_map = IdentityMap()
+
+    def add(self, *objects):
+        """
+        Add objects to be saved on the next flush.
+        :param objects: models objects.
+        """
+        for obj in objects:
+            if id(obj) not in self._pending_ids:
+                self._pending_ids.add(id(obj))
+                self._pending.append(obj)
+
+    def flush(self, batch_size=1000):
+        """
+        Save the pending objects in dependency order.
+        :param batch_size: number of rows sent by each insert batch.
+        :return: the number of saved objects.
+        """
+        with transaction(self.create_connection):
+            count = 0
+            for cls, objects in self._flush_order():
+                if objects[0].is_new:
+                    count += cls.bulk_save(objects, batch_size)
+                else:
+                    for obj in objects:
+                        obj.save()
+                    count += len(objects)
+                for obj in objects:
+                    self.identity_map.add(obj)
+        self._pending = []
+        self._pending_ids = set()
+        return count
+
+    def _flush_order(self):
+        """
+        Group the pending objects by dependency level, model and state. An
+        object is one level after the pending objects it references.
+        :return: list of (model class, [objects]).
+        """
+        levels = {}
+        for obj in self._pending:
+            stack = [(obj, False)]
+            while stack:
+                current, expanded = stack.pop()
+                parents = self._parents(current)
+                if expanded:
+                    levels[id(current)] = 1 + max(
+                        [levels[id(parent)] for parent in parents
+                         if levels.get(id(parent)) is not None] or [-1])
+                elif id(current) not in levels:
+                    levels[id(current)] = None
+                    stack.append((current, True))
+                    stack.extend((parent, False) for parent in parents
+                                 if id(parent) not in levels)
+        groups = {}
+        for obj in self._pending:
+            key = (levels[id(obj)], obj.__class__, obj.is_new)
+            groups.setdefault(key, []).append(obj)
+        return [(key[1], groups[key]) for key in sorted(
+            groups, key=lambda key: key[0])]
+
+    def _parents(self, obj):
+        """
+        Return the pending objects referenced by the object ForeignFields.
+        """
+        parents = []
+        for name in obj._bf_info.foreign_fields:
+            value = obj._bf_get(name)
+            if isinstance(value, BaseModel) and \
+                    id(value) in self._pending_ids:
+                parents.append(value)
+        return parents
+
+    def __enter__(self):
+        self._transaction = transaction(self.create_connection)
+        self.connection = self._transaction.__enter__()
+        self.identity_map.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            try:
+                self.flush()
+            except BaseException:
+                self._end(*sys.exc_info())
+                raise
+        else:
+            self._pending = []
+            self._pending_ids = set()
+        return self._end(exc_type, exc_value, traceback)
+
+    def _end(self, exc_type, exc_value, traceback):
+        """
+        Commit or roll back the session transaction.
+        """
+        current, self._transaction = self._transaction, None
+        self.connection = None
+        self.identity_map.__exit__(exc_type, exc_value, traceback)
+        self.identity_map.clear()
+        return current.__exit__(exc_type, exc_value, traceback)
@@ -0,0 +1,110 @@
+# Copyright (C) 2015 Clemente Junior
+#
+# This file is part of BifrostDB
+#
+# BifrostDB is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+import unittest
+
+from bifrost.db import SqliteDB
+from bifrost.models import BaseModel, BoolField, CharField, ForeignField, \
+    IntField
+
+POOL = None
+
+TABLES = (
+    'CREATE TABLE customer (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+    'name TEXT, active TEXT)',
+    'CREATE TABLE orders (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+    'status TEXT, qty INTEGER, customer_id INTEGER)',
+)
+
+
+def create_connection():
+    return POOL()
+
+
+class Customer(BaseModel):
+    id = IntField(primary_key=True, null=True)
+    name = CharField()
+    active = BoolField(null=True)
+    _bf_table_name = 'customer'
+    create_connection = create_connection
+
+
+class Order(BaseModel):
+    id = IntField(primary_key=True, null=True)
+    status = CharField()
+    qty = IntField(null=True)
+    customer = ForeignField(Customer, field_name='customer_id', null=True)
+    _bf_table_name = 'orders'
+    create_connection = create_connection
+
+
+class LegacyCustomer(BaseModel):
+
+    def __init__(self):
+        super().__init__()
+        self.id = IntField(primary_key=True, null=True)
+        self.name = CharField()
+        self.active = BoolField(null=True)
+        self.create_connection = create_connection
+        self._bf_table_name = 'customer'
+        self.bf_prepare()
+
+
+class SqliteTestCase(unittest.TestCase):
+    """
+    Test case with a pool of a temporary sqlite database, with the tables
+    of the models above.
+    """
+
+    pool_size = 4
+
+    def setUp(self):
+        global POOL
+        handle, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        POOL = self.pool = SqliteDB.create_pool(
+            self.path, max_size=self.pool_size, timeout=2)
+        connection = POOL()
+        for table in TABLES:
+            connection.command(table)
+        connection.close()
+
+    def tearDown(self):
+        POOL.close()
+        os.remove(self.path)
+
+    def customers(self, *names):
+        customers = []
+        for name in names:
+            customer = Customer()
+            customer.name = name
+            customer.save()
+            customers.append(customer)
+        return customers
+
+    def orders(self, customer, *statuses):
+        orders = []
+        for qty, status in enumerate(statuses):
+            order = Order()
+            order.status = status
+            order.qty = qty
+            order.customer = customer
+            order.save()
+            orders.append(order)
+        return orders
@@ -0,0 +1,78 @@
+# Copyright (C) 2015 Clemente Junior
+#
+# This file is part of BifrostDB
+#
+# BifrostDB is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from bifrost.db import AsyncQuery, IdentityMap
+from bifrost.db import aio
+from support import Customer, SqliteTestCase
+
+
+class AsyncTest(SqliteTestCase, unittest.IsolatedAsyncioTestCase):
+
+    async def _customers(self, *names):
+        customers = []
+        for name in names:
+            customer = Customer()
+            customer.name = name
+            await customer.asave()
+            customers.append(customer)
+        return customers
+
+    async def test_asave_and_get(self):
+        first, second = await self._customers('ana', 'bia')
+        self.assertEqual((first.id, second.id), (1, 2))
+        query = await AsyncQuery(Customer).get(name='bia')
+        self.assertEqual([customer.id for customer in query], [2])
+        customer = Customer()
+        await customer.aload(1)
+        self.assertEqual(customer.name, 'ana')
+        customer.name = 'carla'
+        await customer.asave()
+        self.assertEqual(await AsyncQuery(Customer).count(name='carla'), 1)
+
+    async def test_async_iteration(self):
+        await self._customers('ana', 'bia', 'carla')
+        query = await AsyncQuery(Customer).order('id').get()
+        self.assertEqual([customer.name async for customer in query],
+                         ['ana', 'bia', 'carla'])
+        names = [customer.name async for customer in
+                 AsyncQuery(Customer).iterate(chunk_size=2)]
+        self.assertEqual(sorted(names), ['ana', 'bia', 'carla'])
+
+    async def test_transaction_rollback(self):
+        with self.assertRaises(ValueError):
+            async with aio.transaction(Customer.create_connection):
+                await self._customers('ana')
+                self.assertEqual(await AsyncQuery(Customer).count(), 1)
+                raise ValueError
+        self.assertEqual(await AsyncQuery(Customer).count(), 0)
+        async with aio.transaction(Customer.create_connection):
+            await self._customers('bia')
+        self.assertEqual(await AsyncQuery(Customer).count(), 1)
+
+
+    async def test_identity_map(self):
+        await self._customers('ana')
+        with IdentityMap():
+            first = (await AsyncQuery(Customer).get())[0]
+            second = (await AsyncQuery(Customer).get(name='ana'))[0]
+            self.assertIs(first, second)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# Copyright (C) 2015 Clemente Junior
+#
+# This file is part of BifrostDB
+#
+# BifrostDB is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from bifrost.db import IdentityMap, Query, ResultCache, transaction
+from support import Customer, Order, SqliteTestCase, create_connection
+
+
+class CachedCustomer(Customer):
+    _bf_table_name = 'customer'
+
+
+class IdentityMapTest(SqliteTestCase):
+
+    def test_reuse(self):
+        customer, = self.customers('ana')
+        self.orders(customer, 'new', 'paid')
+        with IdentityMap() as identity_map:
+            first = Query(Customer).get()[0]
+            self.assertIs(Query(Customer).get(name='ana')[0], first)
+            loaded = Customer()
+            loaded.load(customer.id)
+            self.assertIsNot(loaded, first)
+            self.assertEqual(loaded.name, 'ana')
+            orders = Query(Order).get()
+            self.assertTrue(all(order.customer is first for order in orders))
+            self.assertEqual(len(identity_map), 3)
+        self.assertIsNot(Query(Customer).get()[0], first)
+
+
+
+class ResultCacheTest(SqliteTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache = CachedCustomer.bf_result_cache = ResultCache(ttl=None)
+
+    def tearDown(self):
+        CachedCustomer.bf_result_cache = None
+        super().tearDown()
+
+    def test_invalidation(self):
+        customer = CachedCustomer()
+        customer.name = 'ana'
+        customer.save()
+        self.assertEqual(len(Query(CachedCustomer).get(name='ana')), 1)
+        self.assertEqual(len(Query(CachedCustomer).get(name='ana')), 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        customer.name = 'bia'
+        customer.save()
+        self.assertEqual(len(Query(CachedCustomer).get(name='ana')), 0)
+        Query(CachedCustomer).delete(name='bia')
+        self.assertEqual(Query(CachedCustomer).count(), 0)
+
+    def test_transaction_rollback(self):
+        with self.assertRaises(ValueError):
+            with transaction(create_connection):
+                customer = CachedCustomer()
+                customer.name = 'ana'
+                customer.save()
+                self.assertEqual(Query(CachedCustomer).count(), 1)
+                raise ValueError
+        self.assertEqual(Query(CachedCustomer).count(), 0)
+        self.assertEqual(self.cache.hits, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
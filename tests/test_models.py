@@ -0,0 +1,121 @@
+# Copyright (C) 2015 Clemente Junior
+#
+# This file is part of BifrostDB
+#
+# BifrostDB is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+import copy
+import unittest
+
+from bifrost.db import Query
+from bifrost.models import BaseModel, CharField, ForeignField, IntField
+from bifrost.utils import ObjectNotSavedException
+from support import Customer, LegacyCustomer, SqliteTestCase, \
+    create_connection
+
+
+class LazyOrder(BaseModel):
+    id = IntField(primary_key=True, null=True)
+    status = CharField()
+    customer = ForeignField(Customer, field_name='customer_id', lazy=True,
+                            null=True)
+    _bf_table_name = 'orders'
+    create_connection = create_connection
+
+
+class CheckedCustomer(Customer):
+    bf_check_concurrency = True
+    _bf_table_name = 'customer'
+
+
+class LazyModelTest(SqliteTestCase):
+
+    def test_deepcopy(self):
+        customer, = self.customers('ana')
+        order = LazyOrder()
+        order.load_data({'id': 1, 'status': 'new',
+                         'customer_id': customer.id})
+        copied = copy.deepcopy(order)
+        self.assertFalse(copied.customer.is_loaded)
+        self.assertEqual(copied.customer.id, customer.id)
+        self.assertEqual(copied.customer.name, 'ana')
+        self.assertFalse(order.customer.is_loaded)
+
+
+
+class BulkSaveTest(SqliteTestCase):
+
+    def test_bulk_save(self):
+        customers = []
+        for index in range(5):
+            customer = Customer()
+            customer.name = 'c{}'.format(index)
+            customers.append(customer)
+        self.assertEqual(Customer.bulk_save(customers, batch_size=2), 5)
+        self.assertEqual(Query(Customer).count(), 5)
+        self.assertFalse(any(customer.is_new for customer in customers))
+        self.assertEqual(Customer.bulk_save([]), 0)
+
+
+
+class InsertKeyTest(SqliteTestCase):
+
+    def test_save_sets_key(self):
+        first, second = self.customers('ana', 'ana')
+        self.assertEqual((first.id, second.id), (1, 2))
+        customer = LegacyCustomer()
+        customer.name = 'ana'
+        customer.save()
+        self.assertEqual(customer.id, 3)
+
+    def test_bulk_save_sets_keys(self):
+        customers = [Customer() for _ in range(3)]
+        for customer in customers:
+            customer.name = 'ana'
+        Customer.bulk_save(customers)
+        self.assertEqual([customer.id for customer in customers], [1, 2, 3])
+
+
+
+class ChangedFieldsTest(SqliteTestCase):
+
+    def test_update_only_changed(self):
+        customer, = self.customers('ana')
+        first, second = Customer(), Customer()
+        first.load(customer.id)
+        second.load(customer.id)
+        first.name = 'bia'
+        first.save()
+        second.active = True
+        second.save()
+        second.save()
+        loaded = Customer()
+        loaded.load(customer.id)
+        self.assertEqual((loaded.name, loaded.active), ('bia', True))
+
+    def test_concurrency_check(self):
+        customer, = self.customers('ana')
+        first, second = CheckedCustomer(), CheckedCustomer()
+        first.load(customer.id)
+        second.load(customer.id)
+        first.name = 'bia'
+        first.save()
+        second.name = 'carla'
+        self.assertRaises(ObjectNotSavedException, second.save)
+        first.name = 'carla'
+        first.save()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+# Copyright (C) 2015 Clemente Junior
+#
+# This file is part of BifrostDB
+#
+# BifrostDB is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+import unittest
+
+from bifrost.db import SqliteDB
+from bifrost.db.basedb import BaseDBException
+from support import SqliteTestCase
+
+
+class PoolTest(SqliteTestCase):
+
+    def test_checkout_reuses_released(self):
+        pool = SqliteDB.create_pool(self.path, max_size=2)
+        connection = pool()
+        connection.close()
+        self.assertIs(pool(), connection)
+        self.assertEqual((pool.size, pool.idle), (1, 0))
+        pool.close()
+
+    def test_timeout(self):
+        pool = SqliteDB.create_pool(self.path, max_size=1, timeout=0.05)
+        connection = pool()
+        self.assertRaises(BaseDBException, pool)
+        connection.close()
+        self.assertIs(pool(), connection)
+        pool.close()
+
+    def test_waits_for_release(self):
+        pool = SqliteDB.create_pool(self.path, max_size=1, timeout=2)
+        connection = pool()
+        threading.Timer(0.05, connection.close).start()
+        self.assertIs(pool(), connection)
+        pool.close()
+
+    def test_double_release(self):
+        pool = SqliteDB.create_pool(self.path, max_size=2)
+        connection = pool()
+        connection.close()
+        connection.close()
+        self.assertEqual(pool.idle, 1)
+        self.assertIsNot(pool(), pool())
+        pool.close()
+
+    def test_idle_eviction(self):
+        pool = SqliteDB.create_pool(self.path, min_size=1, max_size=3,
+                                    idle_timeout=0.01)
+        connections = [pool(), pool(), pool()]
+        for connection in connections:
+            connection.close()
+        time.sleep(0.02)
+        pool().close()
+        self.assertEqual((pool.size, pool.idle), (1, 1))
+        pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+# Copyright (C) 2015 Clemente Junior
+#
+# This file is part of BifrostDB
+#
+# BifrostDB is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from bifrost.db import Query
+from bifrost.db.basedb import BaseDBException
+from bifrost.db.query import T_COLUMNS, T_TUPLE
+from support import Customer, Order, SqliteTestCase
+
+
+class ColumnsTest(SqliteTestCase):
+
+    def test_columns(self):
+        customer, = self.customers('ana')
+        self.orders(customer, 'new', 'paid')
+        columns = Query(Order).order('id').get(T_COLUMNS)._resultset
+        self.assertEqual(list(columns['qty']), [0, 1])
+        self.assertEqual(list(columns['status']), ['new', 'paid'])
+
+    def test_empty_columns(self):
+        columns = Query(Order).get(T_COLUMNS, status='none')._resultset
+        self.assertEqual(set(columns), {'id', 'status', 'qty', 'customer_id'})
+        self.assertTrue(all(len(values) == 0 for values in columns.values()))
+
+    def test_null_bool(self):
+        for active in (True, None, False):
+            customer = Customer()
+            customer.name = 'ana'
+            customer.active = active
+            customer.save()
+        columns = Query(Customer).order('id').get(T_COLUMNS)._resultset
+        self.assertEqual(list(columns['active']), [True, None, False])
+
+
+class SinglePoolTest(SqliteTestCase):
+
+    pool_size = 1
+
+    def test_iterate_loads_foreign_fields(self):
+        customer, = self.customers('ana')
+        self.orders(customer, 'new', 'paid', 'new')
+        orders = list(Query(Order).iterate(chunk_size=2))
+        self.assertEqual([order.status for order in orders],
+                         ['new', 'paid', 'new'])
+        self.assertEqual({order.customer.name for order in orders}, {'ana'})
+        self.assertEqual(self.pool.idle, 1)
+
+
+
+class PageTest(SqliteTestCase):
+
+    def setUp(self):
+        super().setUp()
+        first, second = self.customers('ana', 'bia')
+        self.orders(first, 'a', 'b', 'c')
+        self.orders(second, 'd', 'e')
+
+    def test_limit_offset(self):
+        query = Query(Order).order('id').limit(2).offset(1).get()
+        self.assertEqual([order.status for order in query], ['b', 'c'])
+        query = Query(Order).order('-id').limit(2).get()
+        self.assertEqual([order.status for order in query], ['e', 'd'])
+
+    def test_after(self):
+        query = Query(Order).order('id').limit(2).after(id=2).get()
+        self.assertEqual([order.status for order in query], ['c', 'd'])
+        query = Query(Order).order('-customer', 'id').after(customer=2, id=5)
+        self.assertEqual([order.status for order in query.get()],
+                         ['a', 'b', 'c'])
+
+    def test_after_without_order_value(self):
+        query = Query(Order).order('customer', 'id').after(id=2)
+        self.assertRaises(BaseDBException, query.get)
+        self.assertEqual(len(query.get()), 5)
+
+
+
+class DeleteTest(SqliteTestCase):
+
+    def setUp(self):
+        super().setUp()
+        customer, = self.customers('ana')
+        self.orders(customer, 'new', 'paid', 'new')
+
+    def test_delete(self):
+        self.assertEqual(Query(Order).delete(status='new'), 2)
+        self.assertEqual(Query(Order).delete(status='new'), 0)
+        self.assertEqual([order.status for order in Query(Order).get()],
+                         ['paid'])
+
+    def test_delete_all(self):
+        query = Query(Order).get(status='new')
+        self.assertEqual(query.delete_all(chunk_size=1), 2)
+        self.assertEqual(len(query), 0)
+        self.assertEqual(len(Query(Order).get()), 1)
+
+
+
+class UpdateTest(SqliteTestCase):
+
+    def test_update(self):
+        first, second = self.customers('ana', 'bia')
+        self.orders(first, 'new', 'new', 'paid')
+        self.assertEqual(Query(Order).update({'status': 'sent'},
+                                             status='new'), 2)
+        self.assertEqual(Query(Order).update({'customer': second},
+                                             status='paid'), 1)
+        self.assertEqual(Query(Order).update({}, status='sent'), 0)
+        self.assertEqual(Query(Order).count(status='sent'), 2)
+        self.assertEqual(Query(Order).count(customer=second), 1)
+
+
+
+class CountTest(SqliteTestCase):
+
+    def test_count_exists(self):
+        customer, = self.customers('ana')
+        self.orders(customer, 'new', 'paid', 'new')
+        self.assertEqual(Query(Order).count(), 3)
+        self.assertEqual(Query(Order).count(status='new'), 2)
+        self.assertEqual(Query(Order).count(status__not='new'), 1)
+        self.assertTrue(Query(Order).exists(status='paid'))
+        self.assertFalse(Query(Order).exists(status='sent'))
+
+
+
+class IndexTest(SqliteTestCase):
+
+    def test_only(self):
+        first, second = self.customers('ana', 'bia')
+        self.orders(first, 'new', 'paid', 'new')
+        self.orders(second, 'new')
+        query = Query(Order).order('id').get()
+        expected = [order.id for order in query.only(status='new')]
+        query.index_by('status', 'qty')
+        self.assertEqual([order.id for order in query.only(status='new')],
+                         expected)
+        self.assertEqual(len(expected), 3)
+        self.assertEqual([order.id for order in
+                          query.only(status='new', qty=0)], [1, 4])
+        self.assertEqual(query.only(status='sent'), [])
+        groups = query.group_by_field('status')
+        self.assertEqual({key: len(rows) for key, rows in groups.items()},
+                         {'new': 3, 'paid': 1})
+        query.get(status='paid')
+        self.assertEqual(len(query.only(status='new')), 0)
+
+
+
+class TupleTest(SqliteTestCase):
+
+    def test_tuples(self):
+        customer, = self.customers('ana')
+        self.orders(customer, 'new', 'paid')
+        rows = list(Query(Order).order('id').get(T_TUPLE))
+        self.assertEqual([(row.status, row.qty) for row in rows],
+                         [('new', 0), ('paid', 1)])
+        self.assertEqual(rows[0].customer_id, customer.id)
+        self.assertIs(type(rows[0]), type(rows[1]))
+        streamed = list(Query(Order).order('id').iterate(
+            result_type=T_TUPLE))
+        self.assertEqual(streamed, rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# Copyright (C) 2015 Clemente Junior
+#
+# This file is part of BifrostDB
+#
+# BifrostDB is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Foobar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from bifrost.db import Query, transaction
+from bifrost.models import Session
+from support import Customer, Order, SqliteTestCase, create_connection
+
+
+class TransactionTest(SqliteTestCase):
+
+    def test_commit(self):
+        with transaction(create_connection) as connection:
+            self.customers('ana', 'bia')
+            self.assertTrue(connection.in_transaction)
+        self.assertFalse(connection.in_transaction)
+        self.assertEqual(Query(Customer).count(), 2)
+
+    def test_rollback(self):
+        with self.assertRaises(ValueError):
+            with transaction(create_connection):
+                self.customers('ana')
+                with transaction(create_connection):
+                    self.customers('bia')
+                raise ValueError
+        self.assertEqual(Query(Customer).count(), 0)
+
+
+class SessionTest(SqliteTestCase):
+
+    def test_flush_order(self):
+        customer = Customer()
+        customer.name = 'ana'
+        order = Order()
+        order.status = 'new'
+        order.customer = customer
+        with Session(create_connection) as session:
+            session.add(order, customer)
+        self.assertIsNotNone(customer.id)
+        loaded = Query(Order).get()[0]
+        self.assertEqual(loaded.customer.id, customer.id)
+
+    def test_rollback(self):
+        with self.assertRaises(ValueError):
+            with Session(create_connection) as session:
+                customer = Customer()
+                customer.name = 'ana'
+                session.add(customer)
+                session.flush()
+                raise ValueError
+        self.assertEqual(Query(Customer).count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()